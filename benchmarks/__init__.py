@@ -0,0 +1 @@
+from benchmarks.fakes import FakeApifyClientAsync, FakeBackendError, FakeChatModel, Latency, needs_images
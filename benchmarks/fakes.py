@@ -0,0 +1,477 @@
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+_CLASSIFICATION_QUERY = re.compile(r'^Query: "(.*)"$', re.MULTILINE)
+_BATCH_QUERY = re.compile(r'^(\d+)\. "(.*)"$', re.MULTILINE)
+_AGENT_QUERY = re.compile(r'^Answer this query comprehensively: "(.*)"$', re.MULTILINE)
+_WORDS = ("the", "interior", "design", "features", "a", "clean", "layout", "with", "modern",
+          "materials", "and", "clear", "controls", "visible", "in", "each", "image")
+
+class FakeBackendError(Exception):
+    """Injected failure of a stand-in backend (``status_code`` 429 when over quota)."""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class _Quota:
+    """Concurrent calls a stand-in backend accepts before answering 429 (None = unlimited)."""
+
+    def __init__(self, limit: int = None):
+        self.limit = limit
+        self.in_use = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            if self.limit is not None and self.in_use >= self.limit:
+                self.rejected += 1
+                raise FakeBackendError(f"429 Too Many Requests: over {self.limit} concurrent calls", 429)
+            self.in_use += 1
+
+    def leave(self):
+        with self._lock:
+            self.in_use -= 1
+
+class Latency:
+    """
+    Latency distribution for a stand-in backend.
+
+    Supported distributions:
+    - ``constant``: always ``median``
+    - ``uniform``: between ``median * (1 - spread)`` and ``median * (1 + spread)``
+    - ``lognormal``: median ``median`` with shape ``spread`` (long right tail)
+    - ``exponential``: mean ``median``
+
+    Attributes:
+        median (float): Typical latency in seconds
+        spread (float): Distribution width (see above)
+        distribution (str): Distribution name
+    """
+
+    DISTRIBUTIONS = ('constant', 'uniform', 'lognormal', 'exponential')
+
+    def __init__(self, median: float, spread: float = 0.5, distribution: str = "lognormal"):
+        """
+        Define a latency distribution.
+
+        Args:
+            median (float): Typical latency in seconds
+            spread (float, optional): Distribution width. Defaults to 0.5.
+            distribution (str, optional): One of ``DISTRIBUTIONS``. Defaults to "lognormal".
+
+        Raises:
+            ValueError: If the distribution is unknown
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.median = median
+        self.spread = spread
+        self.distribution = distribution
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        Draw one latency.
+
+        Args:
+            rng (random.Random): Source of randomness
+
+        Returns:
+            float: Latency in seconds (never negative)
+        """
+        if self.distribution == 'constant':
+            return self.median
+        if self.distribution == 'uniform':
+            return max(0.0, rng.uniform(self.median * (1 - self.spread), self.median * (1 + self.spread)))
+        if self.distribution == 'lognormal':
+            return self.median * math.exp(rng.gauss(0.0, self.spread))
+        return rng.expovariate(1.0 / self.median) if self.median > 0 else 0.0
+
+    def __repr__(self):
+        return f"Latency({self.median!r}, spread={self.spread!r}, distribution={self.distribution!r})"
+
+class _Seeded:
+    """
+    Deterministic per-call randomness.
+
+    Each call draws from a generator seeded by the backend seed, the call's
+    input and how often that input has been seen, so results do not depend
+    on the order in which concurrent calls arrive.
+    """
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def rng(self, key: str) -> random.Random:
+        with self._lock:
+            occurrence = self._seen.get(key, 0)
+            self._seen[key] = occurrence + 1
+        return random.Random(f"{self.seed}:{key}:{occurrence}")
+
+def needs_images(query: str, visual_rate: float, seed: int = 0) -> bool:
+    """
+    Deterministic stand-in for the classifier's YES/NO decision.
+
+    Args:
+        query (str): User query
+        visual_rate (float): Share of queries answered YES
+        seed (int, optional): Changes which queries are visual. Defaults to 0.
+
+    Returns:
+        bool: Whether the fake classifier says the query needs images
+    """
+    return random.Random(f"{seed}:visual:{query}").random() < visual_rate
+
+class FakeChatModel:
+    """
+    Stand-in for ``ChatGoogleGenerativeAI`` with simulated latency and failures.
+
+    It recognizes the assistant's prompts: single and batched YES/NO
+    classification (answered by ``needs_images``), agent-mode prompts (which
+    request the ``search_images`` tool for visual queries) and everything
+    else, which is answered with ``output_tokens`` words of filler text.
+    Responses carry ``usage_metadata`` like the real model's.
+
+    Attributes:
+        latency (Latency): Time per call (spread over the chunks when streaming)
+        failure_rate (float): Probability that a call raises ``FakeBackendError``
+        visual_rate (float): Share of queries classified as needing images
+        output_tokens (int): Words in a generated answer
+        max_concurrent (int): Concurrent calls accepted before answering 429
+        calls (int): Calls made so far
+        failures (int): Calls that failed
+    """
+
+    def __init__(self, latency: Latency = None, failure_rate: float = 0.0, visual_rate: float = 0.5,
+                 output_tokens: int = 200, seed: int = 0, stream_chunks: int = 10, max_concurrent: int = None):
+        """
+        Configure the stand-in model.
+
+        Args:
+            latency (Latency, optional): Call latency. Defaults to ``Latency(0.8)``.
+            failure_rate (float, optional): Failure probability per call. Defaults to 0.0.
+            visual_rate (float, optional): Share of visual queries. Defaults to 0.5.
+            output_tokens (int, optional): Length of generated answers. Defaults to 200.
+            seed (int, optional): Seed for latencies, failures and decisions. Defaults to 0.
+            stream_chunks (int, optional): Chunks per streamed answer. Defaults to 10.
+            max_concurrent (int, optional): Concurrency quota; calls beyond it
+                raise ``FakeBackendError`` with status 429. Defaults to None (unlimited).
+        """
+        self.latency = latency or Latency(0.8)
+        self.failure_rate = failure_rate
+        self.visual_rate = visual_rate
+        self.output_tokens = output_tokens
+        self.seed = seed
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+        self.failures = 0
+        self._seeded = _Seeded(seed)
+        self._lock = threading.Lock()
+        self._quota = _Quota(max_concurrent)
+        self._tools = []
+
+    @property
+    def max_concurrent(self) -> int:
+        return self._quota.limit
+
+    @property
+    def rejected(self) -> int:
+        """Calls answered with 429."""
+        return self._quota.rejected
+
+    def bind_tools(self, tools: list) -> "FakeChatModel":
+        """Return a copy of this model that may answer with tool calls."""
+        bound = FakeChatModel(self.latency, self.failure_rate, self.visual_rate, self.output_tokens,
+                              self.seed, self.stream_chunks)
+        bound._tools = [tool['name'] for tool in tools]
+        bound._quota = self._quota
+        return bound
+
+    def invoke(self, prompt: str, **kwargs) -> AIMessage:
+        self._quota.enter()
+        try:
+            delay, message = self._respond(prompt)
+            time.sleep(delay)
+            return self._deliver(message)
+        finally:
+            self._quota.leave()
+
+    async def ainvoke(self, prompt: str, **kwargs) -> AIMessage:
+        self._quota.enter()
+        try:
+            delay, message = self._respond(prompt)
+            await asyncio.sleep(delay)
+            return self._deliver(message)
+        finally:
+            self._quota.leave()
+
+    async def astream(self, prompt: str, **kwargs):
+        self._quota.enter()
+        try:
+            delay, message = self._respond(prompt)
+            if isinstance(message, Exception):
+                await asyncio.sleep(delay / self.stream_chunks)
+                raise message
+            words = message.content.split(" ")
+            size = max(1, math.ceil(len(words) / self.stream_chunks))
+            pieces = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+            for piece in pieces:
+                await asyncio.sleep(delay / len(pieces))
+                yield AIMessageChunk(content=piece)
+        finally:
+            self._quota.leave()
+
+    def _respond(self, prompt: str) -> tuple:
+        """Decide the latency and the message (or failure) for one call."""
+        rng = self._seeded.rng(prompt)
+        delay = self.latency.sample(rng)
+        with self._lock:
+            self.calls += 1
+            call_id = self.calls
+        if rng.random() < self.failure_rate:
+            self.failures += 1
+            return delay, FakeBackendError("Simulated chat model failure")
+
+        batch = _BATCH_QUERY.findall(prompt)
+        single = _CLASSIFICATION_QUERY.search(prompt)
+        agent = _AGENT_QUERY.search(prompt)
+        tool_calls = []
+        if batch:
+            content = "\n".join(
+                f"{number}. {'YES' if needs_images(query, self.visual_rate, self.seed) else 'NO'}"
+                for number, query in batch
+            )
+        elif single:
+            content = "YES" if needs_images(single.group(1), self.visual_rate, self.seed) else "NO"
+        elif agent and self._tools and needs_images(agent.group(1), self.visual_rate, self.seed):
+            content = ""
+            tool_calls = [{'name': self._tools[0], 'args': {'query': agent.group(1)}, 'id': f"call_{call_id}"}]
+        else:
+            content = " ".join(rng.choice(_WORDS) for _ in range(self.output_tokens))
+
+        input_tokens = math.ceil(len(prompt) / 4)
+        output_tokens = len(content.split()) if content else 1
+        return delay, AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                'input_tokens': input_tokens,
+                'output_tokens': output_tokens,
+                'total_tokens': input_tokens + output_tokens
+            }
+        )
+
+    @staticmethod
+    def _deliver(message):
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+class _Page:
+    """Result page of ``list_items``, shaped like the Apify client's."""
+
+    def __init__(self, items: list, offset: int, limit: int, total: int):
+        self.items = items
+        self.offset = offset
+        self.limit = limit
+        self.count = len(items)
+        self.total = total
+
+class _FakeRun:
+    def __init__(self, run_id: str, run_input: dict, duration: float, failed: bool):
+        self.id = run_id
+        self.input = run_input
+        self.started_at = time.monotonic()
+        self.finishes_at = self.started_at + duration
+        self.failed = failed
+        self.aborted = False
+
+    def status(self) -> str:
+        if self.aborted:
+            return 'ABORTED'
+        if time.monotonic() < self.finishes_at:
+            return 'RUNNING'
+        return 'FAILED' if self.failed else 'SUCCEEDED'
+
+    def as_dict(self) -> dict:
+        return {'id': self.id, 'status': self.status(), 'defaultDatasetId': f"dataset-{self.id}"}
+
+class _FakeActorClient:
+    def __init__(self, apify: "FakeApifyClientAsync"):
+        self._apify = apify
+
+    async def start(self, run_input: dict = None, **kwargs) -> dict:
+        return self._apify._start(run_input or {}).as_dict()
+
+    async def call(self, run_input: dict = None, **kwargs) -> dict:
+        run = self._apify._start(run_input or {})
+        return await self._apify.run(run.id).wait_for_finish()
+
+class _FakeRunClient:
+    def __init__(self, apify: "FakeApifyClientAsync", run_id: str):
+        self._apify = apify
+        self._run = apify._runs[run_id]
+
+    async def get(self) -> dict:
+        return self._run.as_dict()
+
+    async def wait_for_finish(self, wait_secs: float = None) -> dict:
+        while self._run.status() == 'RUNNING':
+            await asyncio.sleep(max(0.0, self._run.finishes_at - time.monotonic()))
+        if self._run.failed and not self._run.aborted:
+            raise FakeBackendError(f"Simulated actor run failure ({self._run.id})")
+        return self._run.as_dict()
+
+    async def abort(self) -> dict:
+        if self._run.status() == 'RUNNING':
+            self._run.aborted = True
+            self._apify.aborted += 1
+        return self._run.as_dict()
+
+class _FakeDatasetClient:
+    def __init__(self, apify: "FakeApifyClientAsync", dataset_id: str):
+        self._apify = apify
+        self._run = apify._runs[dataset_id[len("dataset-"):]]
+
+    async def list_items(self, offset: int = 0, limit: int = None, fields: list = None, desc: bool = False,
+                         **kwargs) -> _Page:
+        items = self._visible_items()
+        offset = offset or 0
+        page = (items[::-1] if desc else items)[offset:offset + limit if limit else None]
+        if fields:
+            page = [{key: item[key] for key in fields if key in item} for item in page]
+        return _Page(page, offset, limit, len(items))
+
+    async def iterate_items(self, fields: list = None, **kwargs):
+        for item in (await self.list_items(fields=fields)).items:
+            yield item
+
+    def _visible_items(self) -> list:
+        """Items written so far: the actor pushes its single summary item when it finishes."""
+        if self._run.status() == 'RUNNING':
+            return []
+        return [self._apify._summary(self._run, self._apify._images(self._run))]
+
+class FakeApifyClientAsync:
+    """
+    Stand-in for ``ApifyClientAsync`` running a simulated image finder actor.
+
+    Runs take a sampled duration and may fail. Like the real actor, a run
+    writes one summary item (``images``, ``search_perspectives``,
+    ``total_results``, ``agent_response``) when it finishes; its dataset is
+    empty while it is in progress. Images are
+    generated deterministically from the query, including a share of
+    duplicates across perspectives and URL variants.
+
+    Attributes:
+        run_latency (Latency): Duration of an actor run
+        failure_rate (float): Probability that a run fails
+        result_size (int): Images per run at most (also capped by ``maxResults``)
+        perspectives (int): Search perspectives per run
+        duplicate_rate (float): Share of images that repeat an earlier one
+        max_concurrent_runs (int): Runs in progress accepted before answering 429
+        runs (int): Runs started
+        aborted (int): Runs aborted while in progress
+    """
+
+    def __init__(self, run_latency: Latency = None, failure_rate: float = 0.0, result_size: int = 10,
+                 perspectives: int = 3, duplicate_rate: float = 0.2, seed: int = 0,
+                 max_concurrent_runs: int = None):
+        """
+        Configure the stand-in client.
+
+        Args:
+            run_latency (Latency, optional): Run duration. Defaults to ``Latency(8.0)``.
+            failure_rate (float, optional): Failure probability per run. Defaults to 0.0.
+            result_size (int, optional): Images per run at most. Defaults to 10.
+            perspectives (int, optional): Perspectives per run. Defaults to 3.
+            duplicate_rate (float, optional): Share of duplicate images. Defaults to 0.2.
+            seed (int, optional): Seed for durations, failures and results. Defaults to 0.
+            max_concurrent_runs (int, optional): Concurrent run quota; starts
+                beyond it raise ``FakeBackendError`` with status 429. Defaults to None (unlimited).
+        """
+        self.run_latency = run_latency or Latency(8.0)
+        self.failure_rate = failure_rate
+        self.result_size = result_size
+        self.perspectives = perspectives
+        self.duplicate_rate = duplicate_rate
+        self.seed = seed
+        self.max_concurrent_runs = max_concurrent_runs
+        self.runs = 0
+        self.aborted = 0
+        self.rejected = 0
+        self._seeded = _Seeded(seed)
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def actor(self, actor_id: str) -> _FakeActorClient:
+        return _FakeActorClient(self)
+
+    def run(self, run_id: str) -> _FakeRunClient:
+        return _FakeRunClient(self, run_id)
+
+    def dataset(self, dataset_id: str) -> _FakeDatasetClient:
+        return _FakeDatasetClient(self, dataset_id)
+
+    def _start(self, run_input: dict) -> _FakeRun:
+        rng = self._seeded.rng(repr(sorted(run_input.items())))
+        with self._lock:
+            if self.max_concurrent_runs is not None:
+                running = sum(1 for run in self._runs.values() if run.status() == 'RUNNING')
+                if running >= self.max_concurrent_runs:
+                    self.rejected += 1
+                    raise FakeBackendError(f"429 Too Many Requests: over {self.max_concurrent_runs} concurrent runs", 429)
+            self.runs += 1
+            run = _FakeRun(f"run{self.runs}", run_input, self.run_latency.sample(rng),
+                           rng.random() < self.failure_rate)
+            self._runs[run.id] = run
+        return run
+
+    def _images(self, run: _FakeRun) -> list:
+        """The images a run finds, always the same for the same query."""
+        query = str(run.input.get('query', ''))
+        count = min(self.result_size, int(run.input.get('maxResults', self.result_size)))
+        rng = random.Random(f"{self.seed}:images:{query}")
+        slug = "-".join(query.lower().split()) or "image"
+        images = []
+        for i in range(count):
+            perspective = f"{query} {('overview', 'detail', 'context', 'close-up', 'comparison')[i % 5]}"
+            if images and rng.random() < self.duplicate_rate:
+                original = rng.choice(images)
+                images.append(dict(original, link=original['link'].replace("https://", "http://") + "?w=800",
+                                   perspective_query=perspective))
+                continue
+            host = f"images{rng.randint(1, 4)}.example.com"
+            images.append({
+                'title': f"{query.title()} photo {i + 1} | Example {host[6]}",
+                'link': f"https://{host}/{slug}/{i + 1}.jpg",
+                'display_link': host,
+                'width': rng.choice((640, 800, 1024, 1280, 1920)),
+                'height': rng.choice((480, 600, 768, 720, 1080)),
+                'perspective_query': perspective
+            })
+        return images
+
+    def _summary(self, run: _FakeRun, images: list) -> dict:
+        query = str(run.input.get('query', ''))
+        names = ('overview', 'detail', 'context', 'close-up', 'comparison')
+        perspectives = [
+            {'perspective_type': names[i % 5], 'query': f"{query} {names[i % 5]}",
+             'images_found': sum(1 for img in images if img['perspective_query'].endswith(names[i % 5]))}
+            for i in range(self.perspectives)
+        ]
+        return {
+            'images': images,
+            'search_perspectives': perspectives,
+            'total_results': len(images),
+            'agent_response': f"Searched {len(perspectives)} perspectives for '{query}'"
+        }
@@ -0,0 +1,366 @@
+"""
+Offline benchmark of the full ``process_query`` pipeline.
+
+The assistant runs against the stand-in backends of ``benchmarks.fakes``:
+no API keys, no network and no spend, with latencies, failure rates and
+result sizes under your control. The same seeded workload runs in four modes:
+
+- sequential: one ``process_query`` after another
+- threaded: ``process_query`` from a pool of threads
+- async: ``aprocess_query`` tasks on one event loop
+- batch: ``process_queries`` (batched classification, bounded concurrency)
+
+For each mode it reports throughput and p50/p95/p99 latency per stage
+(classification, search, context, generation and the whole query), and
+writes them as JSON so runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.run -n 40 -o results.json
+    python -m benchmarks.run --scale 0.1 --llm-failure-rate 0.02 --baseline results.json
+    python -m benchmarks.run --cassette traffic.jsonl.gz --scale 0.1
+    python -m benchmarks.run -c 32 --llm-quota 8 --actor-quota 4 --rate-limit
+
+Latencies are given in real-world seconds and multiplied by ``--scale``, so
+the default run finishes in seconds while keeping the stages' proportions.
+With ``--cassette``, recorded production traffic (see ``cassette.Cassette``)
+replaces the stand-in backends, and its recorded queries are the workload.
+``--llm-quota`` and ``--actor-quota`` make the stand-ins answer 429 beyond a
+number of concurrent calls; ``--rate-limit`` gives the assistant adaptive
+limiters (see ``ratelimit.BackendLimiter``) to stay under them.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.fakes import FakeApifyClientAsync, FakeChatModel, Latency
+from cassette import Cassette
+from main import LangChainApifyAssistant
+from ratelimit import BackendLimiter
+
+MODES = ('sequential', 'threaded', 'async', 'batch')
+
+# Topics and phrasings the workload is drawn from
+_TOPICS = (
+    "Tesla Model Y interior", "machine learning", "Eiffel Tower at night", "photosynthesis",
+    "Scandinavian living room", "French revolution causes", "Golden retriever puppy",
+    "Python list comprehension", "Santorini sunset", "compound interest formula",
+    "Japanese zen garden", "quantum entanglement", "Porsche 911 dashboard", "Kubernetes pods",
+    "northern lights Iceland", "Roman empire timeline", "mid-century modern chair",
+    "HTTP status codes", "Great Barrier Reef coral", "supply and demand curve"
+)
+_PHRASINGS = ("{}", "What is {}?", "Show me {}", "Explain {}", "{} examples", "Tell me about {}")
+
+def make_workload(size: int, repeat_rate: float = 0.1, seed: int = 0) -> list:
+    """
+    Build a deterministic list of queries.
+
+    Args:
+        size (int): Number of queries
+        repeat_rate (float, optional): Share of queries repeating an earlier
+            one (exercises caching and coalescing). Defaults to 0.1.
+        seed (int, optional): Workload seed. Defaults to 0.
+
+    Returns:
+        list: Queries
+    """
+    rng = random.Random(f"{seed}:workload")
+    queries = []
+    for _ in range(size):
+        if queries and rng.random() < repeat_rate:
+            queries.append(rng.choice(queries))
+        else:
+            queries.append(rng.choice(_PHRASINGS).format(rng.choice(_TOPICS)))
+    return queries
+
+class StageRecorder:
+    """
+    Time the assistant's stages by wrapping its stage methods on the instance.
+
+    Attributes:
+        samples (dict): Stage name to list of durations in seconds
+    """
+
+    # Stage name for each wrapped method; ``query`` is the whole pipeline
+    STAGES = {
+        'ashould_search_images': 'classification',
+        'ashould_search_images_batch': 'classification_batch',
+        'asearch_images': 'search',
+        '_build_response_prompt': 'context',
+        'aget_text_response_with_images': 'generation',
+        'aprocess_query': 'query',
+    }
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def instrument(self, assistant: LangChainApifyAssistant):
+        """
+        Wrap the stage methods of one assistant instance.
+
+        Args:
+            assistant (LangChainApifyAssistant): Assistant to instrument
+        """
+        for name, stage in self.STAGES.items():
+            method = getattr(assistant, name)
+            wrapper = self._wrap_async if asyncio.iscoroutinefunction(method) else self._wrap_sync
+            setattr(assistant, name, wrapper(method, stage))
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self) -> dict:
+        """
+        Summarize the recorded durations.
+
+        Returns:
+            dict: Per stage ``count``, ``mean``, ``p50``, ``p95`` and ``p99`` (seconds)
+        """
+        report = {}
+        for stage, samples in sorted(self.samples.items()):
+            values = np.array(samples)
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            report[stage] = {
+                'count': len(samples),
+                'mean': round(float(values.mean()), 6),
+                'p50': round(float(p50), 6),
+                'p95': round(float(p95), 6),
+                'p99': round(float(p99), 6)
+            }
+        return report
+
+    def _wrap_async(self, method, stage: str):
+        @functools.wraps(method)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def _wrap_sync(self, method, stage: str):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+def build_assistant(args) -> LangChainApifyAssistant:
+    """
+    Create an assistant wired to freshly seeded stand-in backends (or a cassette replay).
+
+    Args:
+        args (argparse.Namespace): Benchmark settings (see ``main``)
+
+    Returns:
+        LangChainApifyAssistant: Assistant that never touches the network
+    """
+    def latency(seconds):
+        return Latency(seconds * args.scale, spread=args.spread, distribution=args.distribution)
+
+    limiters = {}
+    if args.rate_limit:
+        limiters = {
+            f"{name}_limiter": BackendLimiter(name, max_concurrency=args.concurrency)
+            for name in ("classifier", "generation", "actor")
+        }
+    if args.cassette:
+        return LangChainApifyAssistant(
+            gemini_key="benchmark",
+            apify_token="benchmark",
+            verbose=False,
+            **limiters,
+            **Cassette.load(args.cassette).replay_backends(time_scale=args.scale)
+        )
+    return LangChainApifyAssistant(
+        gemini_key="benchmark",
+        apify_token="benchmark",
+        verbose=False,
+        llm=FakeChatModel(latency(args.generation_latency), failure_rate=args.llm_failure_rate,
+                          visual_rate=args.visual_rate, output_tokens=args.output_tokens, seed=args.seed,
+                          max_concurrent=args.llm_quota),
+        classifier_llm=FakeChatModel(latency(args.classifier_latency), failure_rate=args.llm_failure_rate,
+                                     visual_rate=args.visual_rate, seed=args.seed, max_concurrent=args.llm_quota),
+        apify_client_async=FakeApifyClientAsync(latency(args.actor_latency), failure_rate=args.actor_failure_rate,
+                                                result_size=args.result_size, seed=args.seed,
+                                                max_concurrent_runs=args.actor_quota),
+        **limiters
+    )
+
+def run_mode(mode: str, queries: list, args) -> dict:
+    """
+    Run the workload in one mode on a fresh assistant.
+
+    Args:
+        mode (str): One of ``MODES``
+        queries (list): Workload
+        args (argparse.Namespace): Benchmark settings
+
+    Returns:
+        dict: ``queries``, ``errors``, ``wall_seconds``, ``throughput_qps`` and
+            ``stages``, plus ``limiters`` with ``--rate-limit``
+    """
+    assistant = build_assistant(args)
+    recorder = StageRecorder()
+    recorder.instrument(assistant)
+
+    def attempt(query):
+        try:
+            assistant.process_query(query)
+            return None
+        except Exception as e:
+            return e
+
+    async def run_async():
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def one(query):
+            async with slots:
+                try:
+                    await assistant.aprocess_query(query)
+                    return None
+                except Exception as e:
+                    return e
+        return await asyncio.gather(*(one(query) for query in queries))
+
+    start = time.perf_counter()
+    try:
+        if mode == 'sequential':
+            outcomes = [attempt(query) for query in queries]
+        elif mode == 'threaded':
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                outcomes = list(pool.map(attempt, queries))
+        elif mode == 'async':
+            outcomes = asyncio.run(run_async())
+        else:
+            results = assistant.process_queries(queries, max_concurrency=args.concurrency)
+            outcomes = [result['error'] for result in results]
+        wall = time.perf_counter() - start
+    finally:
+        assistant.close()
+
+    completed = sum(1 for outcome in outcomes if outcome is None)
+    result = {
+        'queries': len(queries),
+        'errors': len(queries) - completed,
+        'wall_seconds': round(wall, 6),
+        'throughput_qps': round(completed / wall, 3) if wall > 0 else 0.0,
+        'stages': recorder.summary()
+    }
+    if args.rate_limit:
+        result['limiters'] = {
+            limiter.name: limiter.stats()
+            for limiter in (assistant.classifier_limiter, assistant.generation_limiter, assistant.actor_limiter)
+        }
+    return result
+
+def compare(report: dict, baseline: dict) -> list:
+    """
+    Describe changes against an earlier report.
+
+    Args:
+        report (dict): Current report
+        baseline (dict): Report from an earlier run
+
+    Returns:
+        list: One line per mode and per stage present in both reports
+    """
+    lines = []
+    for mode, current in report['modes'].items():
+        previous = baseline.get('modes', {}).get(mode)
+        if not previous:
+            continue
+        if previous['throughput_qps']:
+            change = current['throughput_qps'] / previous['throughput_qps'] - 1
+            lines.append(f"{mode}: throughput {change:+.1%}")
+        for stage, stats in current['stages'].items():
+            before = previous['stages'].get(stage)
+            if before and before['p95']:
+                lines.append(f"  {stage}: p95 {stats['p95'] / before['p95'] - 1:+.1%}")
+    return lines
+
+def _commit() -> str:
+    """Current git commit, if the benchmark runs inside a checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark process_query offline against stand-in backends.")
+    parser.add_argument("-n", "--queries", type=int, default=40, help="queries per mode")
+    parser.add_argument("-m", "--modes", nargs="+", choices=MODES, default=list(MODES), help="modes to run")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="threads, tasks or batch concurrency")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON report to write")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--cassette", help="replay recorded traffic instead of the stand-in backends")
+    parser.add_argument("--seed", type=int, default=0, help="seed for workload and backends")
+    parser.add_argument("--repeat-rate", type=float, default=0.1, help="share of repeated queries")
+    parser.add_argument("--visual-rate", type=float, default=0.5, help="share of queries needing images")
+    parser.add_argument("--scale", type=float, default=0.02, help="multiplier applied to all latencies")
+    parser.add_argument("--distribution", choices=Latency.DISTRIBUTIONS, default="lognormal", help="latency distribution")
+    parser.add_argument("--spread", type=float, default=0.5, help="latency distribution width")
+    parser.add_argument("--classifier-latency", type=float, default=0.4, help="median classifier call (s)")
+    parser.add_argument("--generation-latency", type=float, default=2.5, help="median generation call (s)")
+    parser.add_argument("--actor-latency", type=float, default=8.0, help="median actor run (s)")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="chat model failure probability")
+    parser.add_argument("--actor-failure-rate", type=float, default=0.0, help="actor run failure probability")
+    parser.add_argument("--result-size", type=int, default=10, help="images per actor run")
+    parser.add_argument("--output-tokens", type=int, default=200, help="words per generated answer")
+    parser.add_argument("--llm-quota", type=int, help="concurrent chat model calls accepted before 429")
+    parser.add_argument("--actor-quota", type=int, help="concurrent actor runs accepted before 429")
+    parser.add_argument("--rate-limit", action="store_true", help="give the assistant adaptive rate limiters")
+    args = parser.parse_args(argv)
+
+    if args.cassette:
+        queries = [query for _, query in Cassette.load(args.cassette).queries()][:args.queries]
+    else:
+        queries = make_workload(args.queries, args.repeat_rate, args.seed)
+    report = {
+        'config': vars(args),
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'commit': _commit()
+        },
+        'modes': {}
+    }
+    for mode in args.modes:
+        print(f"⏱️ Running {mode} mode ({len(queries)} queries)...")
+        result = report['modes'][mode] = run_mode(mode, queries, args)
+        query_stats = result['stages'].get('query', {})
+        print(f"   {result['throughput_qps']} queries/s, {result['errors']} errors, "
+              f"p50 {query_stats.get('p50', 0):.3f}s, p95 {query_stats.get('p95', 0):.3f}s, "
+              f"p99 {query_stats.get('p99', 0):.3f}s")
+        for name, limiter in result.get('limiters', {}).items():
+            print(f"   {name}: concurrency {limiter['concurrency']}, {limiter['throttled']} throttled")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("📊 Compared with baseline:")
+        for line in compare(report, baseline):
+            print(f"   {line}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a user query into a cache key.
+
+    Queries that differ only in case, Unicode form, surrounding whitespace,
+    internal spacing or trailing punctuation map to the same key.
+
+    Args:
+        query (str): Raw user query
+
+    Returns:
+        str: Normalized query
+
+    Example:
+        >>> normalize_query("  Tesla  Model Y Interior? ")
+        'tesla model y interior'
+    """
+    query = unicodedata.normalize("NFKC", query).casefold()
+    return " ".join(query.split()).rstrip("?!.。 ")
+
+class LRUDecisionCache:
+    """
+    In-memory LRU cache for YES/NO image-search decisions, with TTL expiry.
+
+    Any object exposing the same ``get(key)`` / ``set(key, value)`` interface
+    can be passed to ``LangChainApifyAssistant(decision_cache=...)``; this is
+    the default in-process implementation. It is safe to share between
+    threads.
+
+    Attributes:
+        max_size (int): Maximum number of decisions kept
+        ttl (float): Seconds a decision stays valid (None = never expires)
+        hits (int): Lookups answered from the cache
+        misses (int): Lookups that fell through to the LLM
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 24 * 3600):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size (int, optional): Maximum number of entries. Defaults to 10000.
+            ttl (float, optional): Entry lifetime in seconds, or None for no
+                expiry. Defaults to 24 hours.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Look up a decision.
+
+        Args:
+            key (str): Normalized query
+
+        Returns:
+            bool or None: The cached decision, or None on a miss or expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                decision, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return decision
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, decision: bool):
+        """
+        Store a decision, evicting the least recently used entry if full.
+
+        Args:
+            key (str): Normalized query
+            decision (bool): Whether the query needs images
+        """
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (decision, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries and reset the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Report cache effectiveness.
+
+        Returns:
+            dict: ``size``, ``hits``, ``misses`` and ``hit_rate``
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+def search_cache_key(query: str, max_results: int) -> str:
+    """
+    Build the cache key for an image search.
+
+    Args:
+        query (str): Raw search query
+        max_results (int): Requested number of images
+
+    Returns:
+        str: Key combining the normalized query and ``max_results``
+    """
+    return f"{normalize_query(query)}|{max_results}"
+
+class SQLiteSearchCache:
+    """
+    Durable SQLite cache for Apify image search results.
+
+    Entries survive restarts and can be shared by several processes on one
+    host: the database runs in WAL mode with a busy timeout, every thread uses
+    its own connection, and writes are single atomic statements.
+
+    Each entry goes through three phases:
+    - fresh (younger than ``ttl``): served as is
+    - stale (younger than ``ttl + stale_ttl``): served immediately, but the
+      caller should refresh it in the background (stale-while-revalidate)
+    - expired: treated as a miss
+
+    ``claim_refresh`` hands the background refresh of a stale key to exactly
+    one caller across all processes for ``refresh_lease`` seconds.
+
+    Attributes:
+        path (str): Database file path
+        ttl (float): Seconds an entry stays fresh
+        stale_ttl (float): Extra seconds a stale entry may still be served
+        hits (int): Fresh lookups served
+        stale_hits (int): Stale lookups served
+        misses (int): Lookups that found nothing usable
+    """
+
+    def __init__(self, path: str = "image_search_cache.sqlite3", ttl: float = 6 * 3600,
+                 stale_ttl: float = 18 * 3600, refresh_lease: float = 300.0):
+        """
+        Open (and if needed create) the cache database.
+
+        Args:
+            path (str, optional): Database file. Defaults to "image_search_cache.sqlite3".
+            ttl (float, optional): Freshness lifetime in seconds. Defaults to 6 hours.
+            stale_ttl (float, optional): Stale-serving window after ``ttl``. Defaults to 18 hours.
+            refresh_lease (float, optional): How long a claimed refresh blocks
+                other claimants. Defaults to 5 minutes.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.refresh_lease = refresh_lease
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    refresh_claimed_at REAL
+                )
+            """)
+
+    def get(self, key: str):
+        """
+        Look up a search result.
+
+        Args:
+            key (str): Key from ``search_cache_key``
+
+        Returns:
+            tuple or None: ``(images_data, fresh)``, or None on a miss
+        """
+        row = self._connection().execute(
+            "SELECT value, stored_at FROM search_results WHERE key = ?", (key,)
+        ).fetchone()
+        age = time.time() - row[1] if row else None
+        if row is None or age > self.ttl + self.stale_ttl:
+            self.misses += 1
+            return None
+        fresh = age <= self.ttl
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return json.loads(row[0]), fresh
+
+    def set(self, key: str, images_data: dict):
+        """
+        Store a search result, replacing any previous entry and refresh claim.
+
+        Args:
+            key (str): Key from ``search_cache_key``
+            images_data (dict): Result returned by ``search_images``
+        """
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_results (key, value, stored_at, refresh_claimed_at) "
+                "VALUES (?, ?, ?, NULL)",
+                (key, json.dumps(images_data, separators=(",", ":")), time.time())
+            )
+
+    def claim_refresh(self, key: str) -> bool:
+        """
+        Try to become the single refresher of a stale entry.
+
+        Args:
+            key (str): Key from ``search_cache_key``
+
+        Returns:
+            bool: True if this caller should refresh the entry
+        """
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE search_results SET refresh_claimed_at = ? "
+                "WHERE key = ? AND (refresh_claimed_at IS NULL OR refresh_claimed_at < ?)",
+                (now, key, now - self.refresh_lease)
+            )
+        return cursor.rowcount == 1
+
+    def purge(self) -> int:
+        """
+        Delete entries too old to be served, even stale.
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM search_results WHERE stored_at < ?",
+                (time.time() - self.ttl - self.stale_ttl,)
+            )
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        """
+        Report cache effectiveness for this process.
+
+        Returns:
+            dict: ``hits``, ``stale_hits``, ``misses`` and ``hit_rate``
+        """
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0
+        }
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
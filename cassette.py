@@ -0,0 +1,592 @@
+import asyncio
+import gzip
+import itertools
+import json
+import threading
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from main import _run_field
+
+TERMINAL_STATUSES = frozenset({'SUCCEEDED', 'FAILED', 'ABORTED', 'TIMED-OUT'})
+
+class CassetteMiss(KeyError):
+    """Raised in strict replay when a request was never recorded."""
+
+class ReplayedError(Exception):
+    """A failure recorded on the cassette, raised again on replay."""
+
+class Cassette:
+    """
+    Recorded Gemini and Apify traffic for offline replay.
+
+    A cassette holds one entry per exchange, in the order they happened:
+    - ``query``: a processed user query and when it arrived
+    - ``llm``: a chat model prompt with its response (content, tool calls,
+      token usage, streamed chunk timings) or error, and latency
+    - ``actor``: an actor run input with its duration, final status and the
+      dataset items read, each with the time it first became visible
+
+    Cassettes are saved as gzip-compressed JSON Lines.
+
+    Example:
+        >>> cassette = Cassette()
+        >>> assistant = cassette.record(LangChainApifyAssistant(gemini_key, apify_token))
+        >>> assistant.process_query("Tesla Model Y interior")
+        >>> cassette.save("traffic.jsonl.gz")
+        >>> replayed = LangChainApifyAssistant(
+        ...     "replay", "replay", **Cassette.load("traffic.jsonl.gz").replay_backends(time_scale=0.5))
+    """
+
+    VERSION = 1
+
+    def __init__(self, entries: list = None):
+        """
+        Create a cassette.
+
+        Args:
+            entries (list, optional): Recorded entries. Defaults to None (empty).
+        """
+        self.entries = list(entries or [])
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._cursors = {}
+        self._index = None
+
+    def add(self, entry: dict) -> dict:
+        """
+        Append an entry (recorders may keep updating it until ``save``).
+
+        Args:
+            entry (dict): Entry with a ``type``
+
+        Returns:
+            dict: The entry
+        """
+        with self._lock:
+            self.entries.append(entry)
+            self._index = None
+        return entry
+
+    def queries(self) -> list:
+        """
+        Recorded user queries, in arrival order.
+
+        Returns:
+            list: ``(seconds after the first query, query)`` tuples
+        """
+        arrivals = [(entry['at'], entry['query']) for entry in self.entries if entry['type'] == 'query']
+        first = arrivals[0][0] if arrivals else 0.0
+        return [(at - first, query) for at, query in arrivals]
+
+    def save(self, path: str):
+        """
+        Write the cassette as gzip-compressed JSON Lines.
+
+        Args:
+            path (str): Output file, e.g. ``traffic.jsonl.gz``
+        """
+        with self._lock:
+            entries = [_export(entry) for entry in self.entries]
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({'type': 'header', 'version': self.VERSION, 'started': self.started}) + "\n")
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        """
+        Read a cassette written by ``save``.
+
+        Args:
+            path (str): Cassette file
+
+        Returns:
+            Cassette: The recorded traffic
+
+        Raises:
+            ValueError: If the file was written by a newer cassette version
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        header = lines[0] if lines and lines[0].get('type') == 'header' else {}
+        if header.get('version', cls.VERSION) > cls.VERSION:
+            raise ValueError(f"Unsupported cassette version: {header['version']}")
+        cassette = cls(lines[1:] if header else lines)
+        cassette.started = header.get('started', cassette.started)
+        return cassette
+
+    def record(self, assistant):
+        """
+        Record an assistant's traffic onto this cassette, wrapping its backends in place.
+
+        Args:
+            assistant (LangChainApifyAssistant): Assistant to record
+
+        Returns:
+            LangChainApifyAssistant: The same assistant
+        """
+        classifier = RecordingChatModel(assistant.classifier_llm, self, 'classifier')
+        batch_classifier = (classifier if assistant.batch_classifier_llm is assistant.classifier_llm
+                            else RecordingChatModel(assistant.batch_classifier_llm, self, 'classifier'))
+        assistant.llm = RecordingChatModel(assistant.llm, self, 'generation')
+        assistant.classifier_llm = classifier
+        assistant.batch_classifier_llm = batch_classifier
+        assistant.apify_client_async = RecordingApifyClientAsync(assistant.apify_client_async, self)
+        # The agent model is bound from ``llm`` on first use; rebind through the recorder
+        assistant._agent_llm = None
+        assistant.metrics_callbacks.insert(0, self._record_query)
+        return assistant
+
+    def replay_backends(self, time_scale: float = 1.0, strict: bool = False) -> dict:
+        """
+        Build stand-in backends that serve this cassette's traffic.
+
+        Args:
+            time_scale (float, optional): Multiplier for recorded latencies
+                (0 = instant). Defaults to 1.0 (original timing).
+            strict (bool, optional): Raise ``CassetteMiss`` for requests that
+                were never recorded, instead of serving another recorded
+                exchange of the same kind. Defaults to False.
+
+        Returns:
+            dict: ``llm``, ``classifier_llm`` and ``apify_client_async`` keyword
+                arguments for ``LangChainApifyAssistant``
+        """
+        return {
+            'llm': ReplayChatModel(self, 'generation', time_scale, strict),
+            'classifier_llm': ReplayChatModel(self, 'classifier', time_scale, strict),
+            'apify_client_async': ReplayApifyClientAsync(self, time_scale, strict)
+        }
+
+    def stats(self) -> dict:
+        """
+        Count the recorded entries.
+
+        Returns:
+            dict: Entries per type
+        """
+        with self._lock:
+            counts = {}
+            for entry in self.entries:
+                counts[entry['type']] = counts.get(entry['type'], 0) + 1
+            return counts
+
+    def _next(self, entry_type: str, key: str, pool: str, strict: bool) -> dict:
+        """
+        Pick the recorded entry answering a request.
+
+        Entries recorded for exactly this request are served in recorded order
+        (cycling when replayed more often than recorded). Without one, strict
+        replay raises; otherwise the entries of ``pool`` are served in turn.
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = {}
+                for entry in self.entries:
+                    if 'key' in entry:
+                        self._index.setdefault(('key', entry['type'], entry['key']), []).append(entry)
+                        self._index.setdefault(('pool', entry['type'], entry.get('pool')), []).append(entry)
+            exact = self._index.get(('key', entry_type, key))
+            if not exact and strict:
+                raise CassetteMiss(f"No recorded {entry_type} exchange for {key[:80]!r}")
+            candidates = exact or self._index.get(('pool', entry_type, pool))
+            if not candidates:
+                raise CassetteMiss(f"No recorded {entry_type} exchanges ({pool})")
+            cursor = self._cursors.setdefault((entry_type, key if exact else pool), itertools.count())
+            return candidates[next(cursor) % len(candidates)]
+
+    def _record_query(self, query: str, metrics: dict):
+        """Metrics callback noting each processed query and when it arrived."""
+        self.add({'type': 'query', 'query': query, 'at': time.time() - metrics['stages']['total']})
+
+def _export(entry: dict) -> dict:
+    """Entry as saved: drop bookkeeping fields and list items in dataset order."""
+    exported = {name: value for name, value in entry.items() if not name.startswith('_')}
+    if '_items' in entry:
+        exported['items'] = [[seen_at, item] for _, (seen_at, item) in sorted(entry['_items'].items())]
+    return exported
+
+def _run_input_key(run_input: dict) -> str:
+    return json.dumps(run_input or {}, sort_keys=True, default=str)
+
+class RecordingChatModel:
+    """
+    Chat model wrapper recording every prompt and response onto a cassette.
+
+    Attributes:
+        model: The wrapped chat model
+        name (str): Pool the exchanges are recorded under (e.g. ``generation``)
+    """
+
+    def __init__(self, model, cassette: Cassette, name: str):
+        self.model = model
+        self.name = name
+        self._cassette = cassette
+
+    def bind_tools(self, tools: list, **kwargs) -> "RecordingChatModel":
+        return RecordingChatModel(self.model.bind_tools(tools, **kwargs), self._cassette, f"{self.name}+tools")
+
+    def invoke(self, prompt, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.model.invoke(prompt, **kwargs)
+        except Exception as e:
+            self._record(prompt, start, error=e)
+            raise
+        self._record(prompt, start, response=response)
+        return response
+
+    async def ainvoke(self, prompt, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.model.ainvoke(prompt, **kwargs)
+        except Exception as e:
+            self._record(prompt, start, error=e)
+            raise
+        self._record(prompt, start, response=response)
+        return response
+
+    async def astream(self, prompt, **kwargs):
+        start = time.perf_counter()
+        chunks = []
+        usage = {}
+        try:
+            async for chunk in self.model.astream(prompt, **kwargs):
+                chunks.append([time.perf_counter() - start, chunk.content if isinstance(chunk.content, str) else ""])
+                for name, value in (getattr(chunk, 'usage_metadata', None) or {}).items():
+                    if isinstance(value, int):
+                        usage[name] = usage.get(name, 0) + value
+                yield chunk
+        except Exception as e:
+            self._record(prompt, start, error=e, chunks=chunks)
+            raise
+        self._record(prompt, start, chunks=chunks, usage=usage)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _record(self, prompt, start: float, response=None, error: Exception = None, chunks: list = None,
+                usage: dict = None):
+        entry = {
+            'type': 'llm',
+            'pool': self.name,
+            'key': str(prompt),
+            'latency': time.perf_counter() - start
+        }
+        if response is not None:
+            entry['content'] = response.content
+            entry['tool_calls'] = list(getattr(response, 'tool_calls', None) or [])
+            usage = getattr(response, 'usage_metadata', None)
+        if chunks is not None:
+            entry['content'] = "".join(text for _, text in chunks)
+            entry['chunks'] = chunks
+        if usage:
+            entry['usage'] = {name: value for name, value in dict(usage).items() if isinstance(value, int)}
+        if error is not None:
+            entry['error'] = f"{type(error).__name__}: {error}"
+        self._cassette.add(entry)
+
+class RecordingApifyClientAsync:
+    """
+    ``ApifyClientAsync`` wrapper recording actor runs and the dataset items read.
+
+    Attributes:
+        client: The wrapped client
+    """
+
+    def __init__(self, client, cassette: Cassette):
+        self.client = client
+        self._cassette = cassette
+        self._runs = {}
+        self._datasets = {}
+
+    def actor(self, actor_id: str) -> "_RecordingActorClient":
+        return _RecordingActorClient(self, actor_id)
+
+    def run(self, run_id: str) -> "_RecordingRunClient":
+        return _RecordingRunClient(self, run_id)
+
+    def dataset(self, dataset_id: str) -> "_RecordingDatasetClient":
+        return _RecordingDatasetClient(self, dataset_id)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _started(self, actor_id: str, run_input: dict, run) -> dict:
+        entry = self._cassette.add({
+            'type': 'actor',
+            'pool': actor_id,
+            'key': _run_input_key(run_input),
+            'input': run_input,
+            'duration': None,
+            'status': None,
+            '_started': time.perf_counter(),
+            '_items': {}
+        })
+        self._runs[_run_field(run, 'id')] = entry
+        self._datasets[_run_field(run, 'defaultDatasetId')] = entry
+        return entry
+
+    def _observed(self, run_id: str, run):
+        """Note the status of a run; the first terminal status fixes its duration."""
+        entry = self._runs.get(run_id)
+        status = _run_field(run, 'status') if run is not None else None
+        if entry is not None and entry['duration'] is None and status in TERMINAL_STATUSES:
+            entry['duration'] = time.perf_counter() - entry['_started']
+            entry['status'] = status
+
+    def _read(self, dataset_id: str, offset: int, items: list):
+        entry = self._datasets.get(dataset_id)
+        if entry is None:
+            return
+        seen_at = time.perf_counter() - entry['_started']
+        for index, item in enumerate(items, offset or 0):
+            entry['_items'].setdefault(index, (seen_at, item))
+
+class _RecordingActorClient:
+    def __init__(self, apify: RecordingApifyClientAsync, actor_id: str):
+        self._apify = apify
+        self._actor_id = actor_id
+        self._actor = apify.client.actor(actor_id)
+
+    async def start(self, run_input: dict = None, **kwargs):
+        run = await self._actor.start(run_input=run_input, **kwargs)
+        self._apify._started(self._actor_id, run_input, run)
+        return run
+
+    async def call(self, run_input: dict = None, **kwargs):
+        started = time.perf_counter()
+        run = await self._actor.call(run_input=run_input, **kwargs)
+        if run is not None:
+            self._apify._started(self._actor_id, run_input, run)['_started'] = started
+            self._apify._observed(_run_field(run, 'id'), run)
+        return run
+
+class _RecordingRunClient:
+    def __init__(self, apify: RecordingApifyClientAsync, run_id: str):
+        self._apify = apify
+        self._run_id = run_id
+        self._run = apify.client.run(run_id)
+
+    async def get(self):
+        run = await self._run.get()
+        self._apify._observed(self._run_id, run)
+        return run
+
+    async def wait_for_finish(self, **kwargs):
+        run = await self._run.wait_for_finish(**kwargs)
+        self._apify._observed(self._run_id, run)
+        return run
+
+    async def abort(self, **kwargs):
+        run = await self._run.abort(**kwargs)
+        self._apify._observed(self._run_id, {'status': 'ABORTED'})
+        return run
+
+class _RecordingDatasetClient:
+    def __init__(self, apify: RecordingApifyClientAsync, dataset_id: str):
+        self._apify = apify
+        self._dataset_id = dataset_id
+        self._dataset = apify.client.dataset(dataset_id)
+
+    async def list_items(self, **kwargs):
+        page = await self._dataset.list_items(**kwargs)
+        offset = kwargs.get('offset') or 0
+        if kwargs.get('desc'):
+            # Newest first: record the items under their positions in the dataset
+            last = page.total - 1 - offset
+            for index, item in enumerate(page.items):
+                self._apify._read(self._dataset_id, last - index, [item])
+        else:
+            self._apify._read(self._dataset_id, offset, page.items)
+        return page
+
+    async def iterate_items(self, **kwargs):
+        index = kwargs.get('offset') or 0
+        async for item in self._dataset.iterate_items(**kwargs):
+            self._apify._read(self._dataset_id, index, [item])
+            index += 1
+            yield item
+
+class ReplayChatModel:
+    """
+    Chat model serving recorded responses with their recorded (scaled) latency.
+
+    Attributes:
+        name (str): Pool of recorded exchanges to fall back on
+        time_scale (float): Multiplier for recorded latencies
+        strict (bool): Whether unrecorded prompts raise ``CassetteMiss``
+    """
+
+    def __init__(self, cassette: Cassette, name: str, time_scale: float = 1.0, strict: bool = False):
+        self.name = name
+        self.time_scale = time_scale
+        self.strict = strict
+        self._cassette = cassette
+
+    def bind_tools(self, tools: list, **kwargs) -> "ReplayChatModel":
+        return ReplayChatModel(self._cassette, f"{self.name}+tools", self.time_scale, self.strict)
+
+    def invoke(self, prompt, **kwargs) -> AIMessage:
+        entry = self._cassette._next('llm', str(prompt), self.name, self.strict)
+        time.sleep(entry['latency'] * self.time_scale)
+        return self._message(entry)
+
+    async def ainvoke(self, prompt, **kwargs) -> AIMessage:
+        entry = self._cassette._next('llm', str(prompt), self.name, self.strict)
+        await asyncio.sleep(entry['latency'] * self.time_scale)
+        return self._message(entry)
+
+    async def astream(self, prompt, **kwargs):
+        entry = self._cassette._next('llm', str(prompt), self.name, self.strict)
+        chunks = entry.get('chunks') or [[entry['latency'], entry.get('content') or ""]]
+        elapsed = 0.0
+        for index, (offset, text) in enumerate(chunks):
+            await asyncio.sleep(max(0.0, offset - elapsed) * self.time_scale)
+            elapsed = offset
+            last = index == len(chunks) - 1
+            if last and 'error' in entry:
+                raise ReplayedError(entry['error'])
+            yield AIMessageChunk(content=text, usage_metadata=entry.get('usage') if last else None)
+        if not chunks and 'error' in entry:
+            raise ReplayedError(entry['error'])
+
+    @staticmethod
+    def _message(entry: dict) -> AIMessage:
+        if 'error' in entry:
+            raise ReplayedError(entry['error'])
+        return AIMessage(content=entry.get('content') or "", tool_calls=entry.get('tool_calls') or [],
+                         usage_metadata=entry.get('usage'))
+
+class _Page:
+    """Result page of ``list_items``, shaped like the Apify client's."""
+
+    def __init__(self, items: list, offset: int, limit: int, total: int):
+        self.items = items
+        self.offset = offset
+        self.limit = limit
+        self.count = len(items)
+        self.total = total
+
+class _ReplayRun:
+    def __init__(self, run_id: str, entry: dict, time_scale: float):
+        self.id = run_id
+        # Entries still being recorded keep their items in bookkeeping form
+        self.entry = _export(entry) if '_items' in entry else entry
+        self.started = time.monotonic()
+        recorded = self.entry.get('duration')
+        if recorded is None:
+            recorded = max([seen_at for seen_at, _ in self.entry.get('items', [])], default=0.0)
+        self.duration = recorded * time_scale
+        self.time_scale = time_scale
+        self.aborted = False
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def status(self) -> str:
+        if self.aborted:
+            return 'ABORTED'
+        if self.elapsed() < self.duration:
+            return 'RUNNING'
+        return self.entry.get('status') or 'SUCCEEDED'
+
+    def visible_items(self) -> list:
+        items = self.entry.get('items', [])
+        if self.status() != 'RUNNING':
+            return [item for _, item in items]
+        elapsed = self.elapsed()
+        return [item for seen_at, item in items if seen_at * self.time_scale <= elapsed]
+
+    def as_dict(self) -> dict:
+        return {'id': self.id, 'status': self.status(), 'defaultDatasetId': f"dataset-{self.id}"}
+
+class ReplayApifyClientAsync:
+    """
+    ``ApifyClientAsync`` stand-in replaying recorded actor runs.
+
+    A replayed run lasts its recorded (scaled) duration, ends with its
+    recorded status, and its dataset reveals items at the (scaled) times
+    they were first seen while recording.
+
+    Attributes:
+        time_scale (float): Multiplier for recorded durations
+        strict (bool): Whether unrecorded run inputs raise ``CassetteMiss``
+        runs (int): Runs started
+        aborted (int): Runs aborted while in progress
+    """
+
+    def __init__(self, cassette: Cassette, time_scale: float = 1.0, strict: bool = False):
+        self.time_scale = time_scale
+        self.strict = strict
+        self.runs = 0
+        self.aborted = 0
+        self._cassette = cassette
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def actor(self, actor_id: str) -> "_ReplayActorClient":
+        return _ReplayActorClient(self, actor_id)
+
+    def run(self, run_id: str) -> "_ReplayRunClient":
+        return _ReplayRunClient(self, self._runs[run_id])
+
+    def dataset(self, dataset_id: str) -> "_ReplayDatasetClient":
+        return _ReplayDatasetClient(self._runs[dataset_id[len("dataset-"):]])
+
+    def _start(self, actor_id: str, run_input: dict) -> _ReplayRun:
+        entry = self._cassette._next('actor', _run_input_key(run_input), actor_id, self.strict)
+        with self._lock:
+            self.runs += 1
+            run = self._runs[f"replay{self.runs}"] = _ReplayRun(f"replay{self.runs}", entry, self.time_scale)
+        return run
+
+class _ReplayActorClient:
+    def __init__(self, apify: ReplayApifyClientAsync, actor_id: str):
+        self._apify = apify
+        self._actor_id = actor_id
+
+    async def start(self, run_input: dict = None, **kwargs) -> dict:
+        return self._apify._start(self._actor_id, run_input).as_dict()
+
+    async def call(self, run_input: dict = None, **kwargs) -> dict:
+        run = self._apify._start(self._actor_id, run_input)
+        return await _ReplayRunClient(self._apify, run).wait_for_finish()
+
+class _ReplayRunClient:
+    def __init__(self, apify: ReplayApifyClientAsync, run: _ReplayRun):
+        self._apify = apify
+        self._run = run
+
+    async def get(self) -> dict:
+        return self._run.as_dict()
+
+    async def wait_for_finish(self, **kwargs) -> dict:
+        while self._run.status() == 'RUNNING':
+            await asyncio.sleep(max(0.0, self._run.duration - self._run.elapsed()))
+        return self._run.as_dict()
+
+    async def abort(self, **kwargs) -> dict:
+        if self._run.status() == 'RUNNING':
+            self._run.aborted = True
+            self._apify.aborted += 1
+        return self._run.as_dict()
+
+class _ReplayDatasetClient:
+    def __init__(self, run: _ReplayRun):
+        self._run = run
+
+    async def list_items(self, offset: int = None, limit: int = None, fields: list = None, desc: bool = False,
+                         **kwargs) -> _Page:
+        items = self._run.visible_items()
+        offset = offset or 0
+        page = (items[::-1] if desc else items)[offset:offset + limit if limit else None]
+        if fields:
+            page = [{key: item[key] for key in fields if key in item} for item in page]
+        return _Page(page, offset, limit, len(items))
+
+    async def iterate_items(self, offset: int = 0, fields: list = None, **kwargs):
+        for item in (await self.list_items(offset=offset, fields=fields)).items:
+            yield item
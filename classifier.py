@@ -0,0 +1,155 @@
+import math
+import re
+import threading
+
+from cache import normalize_query
+
+# (pattern, log-odds weight): positive weights are evidence that a query needs
+# images, negative weights that a text-only answer is enough.
+DEFAULT_RULES = [
+    # Explicit requests for visual media
+    (r"\b(?:photos?|pictures?|pics|images?|screenshots?|wallpapers?|gallery)\b", 3.5),
+    (r"\bwhat (?:does|do|did) .{1,60}? look like\b", 4.0),
+    (r"\b(?:show me|looks? like|appearance|photographs?)\b", 3.0),
+    # Things people usually want to see
+    (r"\b(?:interior|exterior|dashboard|cockpit|floor ?plan|layout|design)\b", 2.5),
+    (r"\b(?:outfit|hairstyle|tattoo|architecture|landmark|logo|diagram|map of)\b", 2.0),
+    (r"\b(?:colou?rs?|shape|style)\b", 1.0),
+    # Definitions, procedures and computation
+    (r"^(?:what is|what are|who is|who was|why|when did|define|explain)\b", -2.5),
+    (r"\bhow (?:to|do i|do you|can i|does)\b", -2.0),
+    (r"\b(?:compute|calculate|convert|solve|formula|equation|algorithm|code|function|error|bug|api)\b", -2.5),
+    (r"\b(?:meaning|definition|history of|difference between|pros and cons|vs)\b", -1.5),
+    (r"\b(?:translate|summari[sz]e|write|essay|email|poem)\b", -2.5),
+]
+
+class RuleBasedIntentClassifier:
+    """
+    Local rules-plus-statistics tier that decides obvious queries without the LLM.
+
+    Every rule is a regex with a log-odds weight. All rules are compiled once
+    into a single pattern of lookaheads, so classifying a query is one regex
+    scan regardless of how many rules are configured, and rules that match
+    at the same position (e.g. ``photo`` and ``photo of``) are all found. The
+    weights of the distinct rules that match are summed into a score, which a
+    logistic link turns into P(needs images).
+
+    A single keyword is weak evidence ("design patterns in python"), so a
+    local answer also needs at least ``min_rules`` matching rules that point
+    the same way; anything less is left to the LLM.
+
+    The weights are statistics, not constants: each rule keeps smoothed
+    counts of the visual and text-only outcomes it co-occurred with, seeded
+    from its initial weight. ``observe`` (called by the assistant whenever
+    the LLM decides a query) updates those counts, so rules that the LLM
+    keeps contradicting lose influence.
+
+    Attributes:
+        threshold (float): Probability needed to answer without the LLM
+        min_rules (int): Agreeing rules needed to answer without the LLM
+        prior_strength (float): Pseudo-count weight of the initial rule weights
+        decided (int): Queries answered locally
+        deferred (int): Queries passed through to the next tier
+    """
+
+    def __init__(self, rules: list = None, threshold: float = 0.9, bias: float = 0.0,
+                 prior_strength: float = 20.0, min_rules: int = 2):
+        """
+        Compile the rule set.
+
+        Args:
+            rules (list, optional): ``(pattern, weight)`` pairs. Patterns are
+                matched against the normalized (lowercase) query and must not
+                define named groups. Defaults to ``DEFAULT_RULES``.
+            threshold (float, optional): Confidence required for a local answer,
+                in both directions. Defaults to 0.9.
+            bias (float, optional): Log-odds added to every score. Defaults to 0.0.
+            prior_strength (float, optional): How many observations the initial
+                weights are worth. Defaults to 20.
+            min_rules (int, optional): Matching rules whose weights must agree
+                with a local answer. Defaults to 2.
+        """
+        rules = DEFAULT_RULES if rules is None else rules
+        self.threshold = threshold
+        self.bias = bias
+        self.prior_strength = prior_strength
+        self.min_rules = min_rules
+        self.decided = 0
+        self.deferred = 0
+        # An always-succeeding lookahead per rule: each records whether its rule
+        # matches here, where an alternation would stop at the first that does
+        self._matcher = re.compile("".join(
+            f"(?=(?P<r{i}>{pattern})|)" for i, (pattern, _) in enumerate(rules)
+        ))
+        # Smoothed (visual, text) outcome counts whose log ratio is the weight
+        self._counts = [self._seed_counts(weight) for _, weight in rules]
+        self._weights = [weight for _, weight in rules]
+        self._lock = threading.Lock()
+
+    def predict(self, query: str) -> float:
+        """
+        Estimate the probability that a query needs images.
+
+        Args:
+            query (str): User query
+
+        Returns:
+            float: P(needs images) in [0, 1]; 0.5 when no rule matches
+        """
+        return self._probability(self._matched_rules(query))
+
+    def classify(self, query: str):
+        """
+        Decide a query locally when the rules are confident enough.
+
+        Args:
+            query (str): User query
+
+        Returns:
+            bool or None: The decision, or None to defer to the next tier
+        """
+        matched = self._matched_rules(query)
+        probability = self._probability(matched)
+        weights = [self._weights[i] for i in matched]
+        if probability >= self.threshold and sum(weight > 0 for weight in weights) >= self.min_rules:
+            self.decided += 1
+            return True
+        if probability <= 1.0 - self.threshold and sum(weight < 0 for weight in weights) >= self.min_rules:
+            self.decided += 1
+            return False
+        self.deferred += 1
+        return None
+
+    def observe(self, query: str, needs_images: bool):
+        """
+        Update rule statistics with an authoritative decision (e.g. from the LLM).
+
+        Args:
+            query (str): User query
+            needs_images (bool): Decision reached for it
+        """
+        with self._lock:
+            for i in self._matched_rules(query):
+                visual, text = self._counts[i]
+                self._counts[i] = (visual + 1, text) if needs_images else (visual, text + 1)
+                visual, text = self._counts[i]
+                self._weights[i] = math.log(visual / text)
+
+    def _matched_rules(self, query: str) -> set:
+        """Return the indices of the distinct rules matching the query."""
+        return {
+            int(name[1:])
+            for match in self._matcher.finditer(normalize_query(query))
+            if match.lastgroup is not None
+            for name, text in match.groupdict().items() if text is not None
+        }
+
+    def _probability(self, matched: set) -> float:
+        """Apply the logistic link to the bias plus the weights of ``matched`` rules."""
+        score = self.bias + sum(self._weights[i] for i in matched)
+        return 1.0 / (1.0 + math.exp(-score))
+
+    def _seed_counts(self, weight: float) -> tuple:
+        """Split ``prior_strength`` pseudo-counts so that log(visual / text) == weight."""
+        visual_share = 1.0 / (1.0 + math.exp(-weight))
+        return (self.prior_strength * visual_share, self.prior_strength * (1.0 - visual_share))
@@ -0,0 +1,159 @@
+import asyncio
+import concurrent.futures
+import threading
+from collections import deque
+
+class _Call:
+    """One in-flight execution shared by every caller of the same key."""
+
+    def __init__(self):
+        self.future = concurrent.futures.Future()
+        self.callers = 0
+        self.waiting = 0
+        self.task = None
+        self.loop = None
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into a single execution.
+
+    The first caller for a key (the leader) runs the work; callers that
+    arrive while it is in flight wait for the leader's result instead of
+    starting their own. Callers can be threads (``do``) or asyncio tasks on
+    any event loop (``ado``), mixed freely.
+
+    For async calls the work runs in its own task, so cancelling one waiting
+    caller does not cancel the shared execution; it is cancelled only once
+    every caller waiting on it has given up.
+
+    Attributes:
+        runs (int): Executions completed
+        coalesced (int): Callers served by another caller's execution
+        served (deque): ``(key, callers)`` for the most recent executions
+        on_complete (callable): Optional ``on_complete(key, callers)`` hook
+    """
+
+    def __init__(self, history: int = 1000, on_complete=None):
+        """
+        Initialize the coalescer.
+
+        Args:
+            history (int, optional): Executions remembered in ``served``. Defaults to 1000.
+            on_complete (callable, optional): Called with ``(key, callers)`` when
+                an execution finishes. Defaults to None.
+        """
+        self.runs = 0
+        self.coalesced = 0
+        self.served = deque(maxlen=history)
+        self.on_complete = on_complete
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """
+        Run ``func()`` once per key among concurrent callers (blocking).
+
+        Args:
+            key (hashable): Identity of the work
+            func (callable): Zero-argument function doing the work
+
+        Returns:
+            The result of the shared execution (exceptions are shared too)
+        """
+        call, leader = self._join(key)
+        if not leader:
+            return call.future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key, call, exception=e)
+            raise
+        self._finish(key, call, result=result)
+        return result
+
+    async def ado(self, key, coro_func):
+        """
+        Await ``coro_func()`` once per key among concurrent callers.
+
+        Args:
+            key (hashable): Identity of the work
+            coro_func (callable): Zero-argument function returning a coroutine
+
+        Returns:
+            The result of the shared execution (exceptions are shared too)
+        """
+        call, leader = self._join(key)
+        if leader:
+            call.loop = asyncio.get_running_loop()
+            call.task = asyncio.ensure_future(self._arun(key, call, coro_func))
+        try:
+            return await asyncio.shield(asyncio.wrap_future(call.future))
+        except asyncio.CancelledError:
+            self._leave(key, call)
+            raise
+
+    def stats(self) -> dict:
+        """
+        Report coalescing effectiveness.
+
+        Returns:
+            dict: ``runs``, ``coalesced``, ``in_flight`` and ``callers_per_run``
+        """
+        with self._lock:
+            total = self.runs + self.coalesced
+            return {
+                'runs': self.runs,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+                'callers_per_run': total / self.runs if self.runs else 0.0
+            }
+
+    def _join(self, key) -> tuple:
+        """Attach to the in-flight call for ``key``, creating it if needed."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            call.callers += 1
+            call.waiting += 1
+            return call, leader
+
+    def _leave(self, key, call: _Call):
+        """Detach a cancelled async caller; cancel the work if nobody is left."""
+        with self._lock:
+            call.waiting -= 1
+            abandon = call.waiting == 0 and not call.future.done() and call.task is not None
+            if abandon and self._calls.get(key) is call:
+                # New callers must start afresh rather than join a dying call
+                del self._calls[key]
+        if abandon:
+            call.loop.call_soon_threadsafe(call.task.cancel)
+
+    async def _arun(self, key, call: _Call, coro_func):
+        try:
+            result = await coro_func()
+        except BaseException as e:
+            self._finish(key, call, exception=e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        self._finish(key, call, result=result)
+
+    def _finish(self, key, call: _Call, result=None, exception: BaseException = None):
+        """Publish the outcome and retire the call."""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            callers = call.callers
+            self.runs += 1
+            self.coalesced += callers - 1
+            self.served.append((key, callers))
+        if isinstance(exception, asyncio.CancelledError):
+            call.future.cancel()
+        elif exception is not None:
+            call.future.set_exception(exception)
+        else:
+            call.future.set_result(result)
+        if self.on_complete is not None:
+            self.on_complete(key, callers)
@@ -0,0 +1,119 @@
+import math
+
+# Templates are compiled once into bound ``str.format`` methods; the builder
+# renders every piece with them and joins the pieces in a single pass.
+_HEADER = "\nI found {total_images} relevant images from {total_perspectives} different search perspectives:\n\nSEARCH PERSPECTIVES USED:\n".format
+_PERSPECTIVE = "• {perspective_type}: '{query}' ({images_found} images)\n".format
+_IMAGES_HEADER = "\nIMAGE DETAILS FOUND:\n".format
+_IMAGE = "{number}. Title: {title}\n   Source: {source}\n   Perspective: {perspective}\n   Size: {width}x{height}\n\n".format
+_OMITTED = "(+{images} more images and {perspectives} more perspectives not shown)\n".format
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text locally, without calling a tokenizer.
+
+    Uses the common ~4 characters per token rule for English text, which is
+    close enough for budgeting prompt sections.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated number of tokens
+    """
+    return math.ceil(len(text) / 4)
+
+class ImageContextBuilder:
+    """
+    Render image search results into prompt context within a token budget.
+
+    Perspectives and image details are added in order until the budget is
+    reached (perspectives may use at most ``perspective_share`` of it), long
+    titles are truncated, and anything left out is summarized in one line.
+    This bounds the generation prompt's input tokens, and with them latency
+    and cost, however large the result set.
+
+    Attributes:
+        max_tokens (int): Token budget for the whole image context
+        max_images (int): Upper bound on images described
+        max_title_chars (int): Titles longer than this are truncated
+        perspective_share (float): Fraction of the budget perspectives may use
+    """
+
+    def __init__(self, max_tokens: int = 800, max_images: int = 5, max_title_chars: int = 120,
+                 perspective_share: float = 0.3):
+        """
+        Configure the budget.
+
+        Args:
+            max_tokens (int, optional): Token budget. Defaults to 800.
+            max_images (int, optional): Most images to describe. Defaults to 5.
+            max_title_chars (int, optional): Title truncation length. Defaults to 120.
+            perspective_share (float, optional): Budget share for perspectives. Defaults to 0.3.
+        """
+        self.max_tokens = max_tokens
+        self.max_images = max_images
+        self.max_title_chars = max_title_chars
+        self.perspective_share = perspective_share
+
+    def build(self, images: list, perspectives: list) -> str:
+        """
+        Render the image context section of the generation prompt.
+
+        Args:
+            images (list): Image objects, most important first
+            perspectives (list): Search perspective objects
+
+        Returns:
+            str: Context text whose estimated size fits ``max_tokens``
+        """
+        header = _HEADER(total_images=len(images), total_perspectives=len(perspectives))
+        images_header = _IMAGES_HEADER()
+        used = estimate_tokens(header) + estimate_tokens(images_header)
+        # Keep room for the omission line (its counts are at most these)
+        budget = self.max_tokens - estimate_tokens(_OMITTED(images=len(images), perspectives=len(perspectives)))
+
+        perspective_parts = []
+        perspective_budget = min(budget, used + self.perspective_share * self.max_tokens)
+        for p in perspectives:
+            part = _PERSPECTIVE(
+                perspective_type=(p.get('perspective_type') or 'Unknown').title(),
+                query=p.get('query', 'N/A'),
+                images_found=p.get('images_found', 0)
+            )
+            cost = estimate_tokens(part)
+            if used + cost > perspective_budget:
+                break
+            perspective_parts.append(part)
+            used += cost
+
+        image_parts = []
+        for img in images[:self.max_images]:
+            part = _IMAGE(
+                number=len(image_parts) + 1,
+                title=self._truncate(str(img.get('title') or 'Untitled')),
+                source=img.get('display_link', 'N/A'),
+                perspective=img.get('perspective_query', 'N/A'),
+                width=img.get('width', 'N/A'),
+                height=img.get('height', 'N/A')
+            )
+            cost = estimate_tokens(part)
+            if used + cost > budget:
+                break
+            image_parts.append(part)
+            used += cost
+
+        parts = [header, *perspective_parts, images_header, *image_parts]
+        # Say so when the budget (rather than max_images) left something out
+        if len(image_parts) < min(len(images), self.max_images) or len(perspective_parts) < len(perspectives):
+            parts.append(_OMITTED(
+                images=len(images) - len(image_parts),
+                perspectives=len(perspectives) - len(perspective_parts)
+            ))
+        return "".join(parts)
+
+    def _truncate(self, title: str) -> str:
+        """Shorten a title to ``max_title_chars``, marking the cut with an ellipsis."""
+        if len(title) <= self.max_title_chars:
+            return title
+        return title[:self.max_title_chars - 1].rstrip() + "…"
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import tempfile
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import record_bytes
+
+# File extensions for the image types search results point to
+_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/avif': '.avif',
+    'image/bmp': '.bmp',
+    'image/svg+xml': '.svg',
+    'image/tiff': '.tiff',
+}
+
+class _Limits:
+    """Concurrency limits of one event loop: a global pool and one per host."""
+
+    def __init__(self, max_concurrency: int, per_host: int):
+        self.total = asyncio.Semaphore(max_concurrency)
+        self.per_host = per_host
+        self.hosts = {}
+
+    def host(self, host: str) -> asyncio.Semaphore:
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host)
+        return self.hosts[host]
+
+class ImageDownloader:
+    """
+    Download search result images concurrently into a content-addressed store.
+
+    Images are fetched with a bounded async pool (``max_concurrency`` overall,
+    at most ``per_host`` at a time from any one host) and stored under the
+    SHA-256 of their bytes (``<directory>/ab/abcdef….jpg``). Identical bytes
+    behind different URLs are stored once, a URL repeated within a call or
+    already downloaded by an earlier one is not requested again, and files
+    are written atomically, so several processes can share one store.
+
+    Pass an instance to ``LangChainApifyAssistant(downloader=...)`` to have
+    ``process_query`` attach ``local_path`` to every image, or use it directly.
+
+    Attributes:
+        directory (str): Root of the image store
+        max_concurrency (int): Downloads in flight at most
+        per_host (int): Downloads in flight at most per host
+        timeout (float): Seconds allowed per request
+        max_bytes (int): Larger images are rejected
+        downloaded (int): Images fetched over the network
+        reused (int): Images served from the store without a request
+        failed (int): Images that could not be fetched
+        bytes_downloaded (int): Bytes received over the network
+    """
+
+    def __init__(self, directory: str = "image_store", max_concurrency: int = 16, per_host: int = 4,
+                 timeout: float = 20.0, max_bytes: int = 20 * 1024 * 1024, headers: dict = None):
+        """
+        Configure the downloader.
+
+        Args:
+            directory (str, optional): Store root, created if missing. Defaults to "image_store".
+            max_concurrency (int, optional): Global download limit. Defaults to 16.
+            per_host (int, optional): Per-host download limit. Defaults to 4.
+            timeout (float, optional): Per-request timeout in seconds. Defaults to 20.0.
+            max_bytes (int, optional): Size limit per image. Defaults to 20 MiB.
+            headers (dict, optional): Extra request headers, e.g. a User-Agent. Defaults to None.
+        """
+        self.directory = directory
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.headers = dict(headers or {})
+        self.downloaded = 0
+        self.reused = 0
+        self.failed = 0
+        self.bytes_downloaded = 0
+        self._paths = {}
+        self._limits = weakref.WeakKeyDictionary()
+        os.makedirs(directory, exist_ok=True)
+
+    def fetch(self, images: list) -> list:
+        """
+        Download images and attach their local paths (blocking).
+
+        Args:
+            images (list): Image objects with a ``link``
+
+        Returns:
+            list: Copies of the images with ``local_path`` (None if the
+                download failed, with the reason in ``download_error``)
+
+        Example:
+            >>> images = ImageDownloader("./images").fetch(result['images'])
+            >>> print(images[0]['local_path'])
+        """
+        return asyncio.run(self.afetch(images))
+
+    async def afetch(self, images: list, client: httpx.AsyncClient = None) -> list:
+        """
+        Async twin of ``fetch``.
+
+        Args:
+            images (list): Image objects with a ``link``
+            client (httpx.AsyncClient, optional): Client to reuse. Defaults to a
+                new client closed when the call returns.
+
+        Returns:
+            list: Copies of the images with ``local_path`` (see ``fetch``)
+        """
+        if not images:
+            return []
+        if client is None:
+            async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True, headers=self.headers,
+                                         limits=httpx.Limits(max_connections=self.max_concurrency)) as client:
+                return await self.afetch(images, client)
+
+        # Each distinct URL is downloaded once, however often it occurs
+        tasks = {}
+        for img in images:
+            link = img.get('link')
+            if link and link not in tasks:
+                tasks[link] = asyncio.ensure_future(self._afetch_url(client, link))
+        try:
+            if tasks:
+                await asyncio.wait(tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        fetched = []
+        for img in images:
+            task = tasks.get(img.get('link'))
+            error = "missing link" if task is None else task.exception()
+            if error is not None:
+                fetched.append(dict(img, local_path=None, download_error=str(error).split("\n")[0] or type(error).__name__))
+            else:
+                fetched.append(dict(img, local_path=task.result()))
+        return fetched
+
+    def stats(self) -> dict:
+        """
+        Report download activity.
+
+        Returns:
+            dict: ``downloaded``, ``reused``, ``failed`` and ``bytes_downloaded``
+        """
+        return {
+            'downloaded': self.downloaded,
+            'reused': self.reused,
+            'failed': self.failed,
+            'bytes_downloaded': self.bytes_downloaded
+        }
+
+    async def _afetch_url(self, client: httpx.AsyncClient, url: str) -> str:
+        """Return the local path of ``url``, downloading it unless already stored."""
+        path = self._paths.get(url)
+        if path is not None and os.path.exists(path):
+            self.reused += 1
+            return path
+
+        limits = self._loop_limits()
+        try:
+            async with limits.total, limits.host(urlsplit(url).hostname or ""):
+                data, extension = await self._adownload(client, url)
+        except Exception:
+            self.failed += 1
+            raise
+        self.downloaded += 1
+        self.bytes_downloaded += len(data)
+        record_bytes('images', len(data))
+        path = await asyncio.get_running_loop().run_in_executor(None, self._store, data, extension)
+        self._paths[url] = path
+        return path
+
+    async def _adownload(self, client: httpx.AsyncClient, url: str) -> tuple:
+        """Fetch the bytes of one image, enforcing ``max_bytes`` while streaming."""
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+            if content_type and not content_type.startswith("image/") and content_type != "application/octet-stream":
+                raise ValueError(f"not an image ({content_type})")
+            length = response.headers.get("content-length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                raise ValueError(f"image larger than {self.max_bytes} bytes")
+            data = bytearray()
+            async for chunk in response.aiter_bytes():
+                data.extend(chunk)
+                if len(data) > self.max_bytes:
+                    raise ValueError(f"image larger than {self.max_bytes} bytes")
+        extension = _EXTENSIONS.get(content_type) or os.path.splitext(urlsplit(url).path)[1].lower()
+        if not mimetypes.guess_type("image" + extension)[0]:
+            extension = ""
+        return bytes(data), extension
+
+    def _store(self, data: bytes, extension: str) -> str:
+        """Write bytes under their SHA-256, unless an identical file is already stored."""
+        digest = hashlib.sha256(data).hexdigest()
+        directory = os.path.join(self.directory, digest[:2])
+        path = os.path.join(directory, digest + extension)
+        if os.path.exists(path):
+            return path
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return path
+
+    def _loop_limits(self) -> _Limits:
+        """Semaphores belong to one event loop; keep a set per loop."""
+        loop = asyncio.get_running_loop()
+        limits = self._limits.get(loop)
+        if limits is None:
+            limits = self._limits[loop] = _Limits(self.max_concurrency, self.per_host)
+        return limits
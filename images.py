@@ -0,0 +1,203 @@
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _tokens(text: str) -> set:
+    return set(_WORD.findall(str(text).lower()))
+
+def rank_images(query: str, images: list, k: int = 5, diversity: float = 0.5,
+                resolution_weight: float = 0.4, relevance_weight: float = 0.6) -> list:
+    """
+    Pick the ``k`` most informative images using maximal marginal relevance.
+
+    Each image gets a quality score from its resolution (log of
+    ``width`` x ``height``, scaled over the candidates) and the relevance of
+    its title to the query (share of query words present in the title).
+    Similarity between two images combines a shared source
+    (``display_link``), a shared ``perspective_query`` and title overlap.
+    MMR then repeatedly picks the image with the best trade-off between
+    quality and dissimilarity to those already picked, so near-identical
+    shots from one perspective or site give way to broader coverage.
+
+    All scoring is vectorized with NumPy; selection is O(k * n).
+
+    Args:
+        query (str): Original user query
+        images (list): Image objects from the actor
+        k (int, optional): Number of images to select. Defaults to 5.
+        diversity (float, optional): 0 ranks purely by quality, 1 purely by
+            novelty. Defaults to 0.5.
+        resolution_weight (float, optional): Weight of resolution in quality. Defaults to 0.4.
+        relevance_weight (float, optional): Weight of title relevance in quality. Defaults to 0.6.
+
+    Returns:
+        list: Up to ``k`` images, best first
+
+    Example:
+        >>> top = rank_images("Tesla Model Y interior", results['images'], k=3)
+    """
+    n = len(images)
+    if n <= 1 or k <= 0:
+        return list(images[:k])
+
+    # Quality: resolution and title relevance, each scaled to [0, 1]
+    areas = np.array([_area(img) for img in images], dtype=np.float64)
+    log_areas = np.log1p(areas)
+    span = log_areas.max() - log_areas.min()
+    resolution = (log_areas - log_areas.min()) / span if span > 0 else np.zeros(n)
+
+    query_tokens = _tokens(query)
+    title_tokens = [_tokens(img.get('title', '')) for img in images]
+    vocabulary = {token: i for i, token in enumerate(set().union(query_tokens, *title_tokens))}
+    incidence = np.zeros((n, max(len(vocabulary), 1)), dtype=np.float64)
+    for row, tokens in enumerate(title_tokens):
+        incidence[row, [vocabulary[token] for token in tokens]] = 1.0
+    query_vector = np.zeros(incidence.shape[1])
+    query_vector[[vocabulary[token] for token in query_tokens]] = 1.0
+    relevance = incidence @ query_vector / max(len(query_tokens), 1)
+
+    quality = resolution_weight * resolution + relevance_weight * relevance
+
+    # Pairwise similarity: same source, same perspective, title Jaccard
+    sources = np.array([str(img.get('display_link', '')) for img in images])
+    perspectives = np.array([str(img.get('perspective_query', '')) for img in images])
+    same_source = (sources[:, None] == sources[None, :]) & (sources[:, None] != "")
+    same_perspective = (perspectives[:, None] == perspectives[None, :]) & (perspectives[:, None] != "")
+    overlap = incidence @ incidence.T
+    sizes = incidence.sum(axis=1)
+    union = sizes[:, None] + sizes[None, :] - overlap
+    title_similarity = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+    similarity = 0.4 * same_source + 0.3 * same_perspective + 0.3 * title_similarity
+
+    # Greedy MMR selection
+    selected = []
+    max_similarity = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    for _ in range(min(k, n)):
+        scores = np.where(available, (1.0 - diversity) * quality - diversity * max_similarity, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return [images[i] for i in selected]
+
+def _area(img: dict) -> float:
+    """Pixel count of an image, or 0 when its size is unknown."""
+    try:
+        return max(float(img.get('width') or 0), 0.0) * max(float(img.get('height') or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+# Query parameters that only select a size or format of an image. Short or
+# generic names (q, s, v, id, ...) are left out on purpose: many image
+# endpoints use them to identify the image itself (e.g. ``images?q=tbn:...``).
+_VARIANT_PARAMS = frozenset({
+    'w', 'h', 'width', 'height', 'size', 'resize', 'fit', 'crop', 'dpr', 'fm', 'format', 'quality'
+})
+_SIZE_SUFFIX = re.compile(r"[-_@](?:\d{2,5}x\d{2,5}|\d{2,5}w|\dx)(?=\.[a-z0-9]+$)", re.IGNORECASE)
+_SIZE_SEGMENT = re.compile(r"^(?:\d{2,5}x\d{2,5}|[a-z]_[^/]*,[^/]*|thumbs?|small|medium|large|original)$", re.IGNORECASE)
+_TITLE_SUFFIX = re.compile(r"\s+[|\-–—]\s+[^|\-–—]{1,40}$")
+# File names too common to identify a photo across hosts: short stems and
+# camera or CMS defaults such as ``1.jpg``, ``image.jpg`` or ``IMG_1234.jpg``
+_GENERIC_FILENAME = re.compile(
+    r"^(?:.{0,5}|(?:img|image|photo|pic|picture|thumb|thumbnail|default|main|hero|dsc|dscn|dcim|screenshot)?[-_ ]?\d*)$",
+    re.IGNORECASE
+)
+_STOPWORDS = frozenset({'a', 'an', 'the', 'of', 'and', 'or', 'in', 'on', 'for', 'to', 'with', 'by', 'at', 'from', 'image', 'photo', 'picture', 'stock'})
+
+def canonical_url(link: str) -> str:
+    """
+    Reduce an image URL to a form shared by its trivial variants.
+
+    Ignores the scheme (http vs https), case and ``www.`` in the host,
+    fragments, query parameters that only pick a size or format variant,
+    CDN size path segments (``/800x600/``, ``/w_800,h_600/``, ``/thumb/``) and
+    size suffixes in the file name (``photo-1024x768.jpg``).
+
+    Args:
+        link (str): Image URL
+
+    Returns:
+        str: Canonical URL (without scheme)
+
+    Example:
+        >>> canonical_url("http://www.example.com/img/car-800x600.jpg?w=800#top")
+        'example.com/img/car.jpg'
+    """
+    parts = urlsplit(str(link).strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    segments = [segment for segment in parts.path.split("/") if segment and not _SIZE_SEGMENT.match(segment)]
+    if segments:
+        segments[-1] = _SIZE_SUFFIX.sub("", segments[-1])
+    query = urlencode(sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in _VARIANT_PARAMS
+    ))
+    path = "/".join([host, *segments])
+    return f"{path}?{query}" if query else path
+
+def title_fingerprint(title: str) -> str:
+    """
+    Fingerprint an image title so that cosmetic variants compare equal.
+
+    Drops a trailing site-name suffix (`` | Site``, `` - Site``), case,
+    punctuation, filler words and word order.
+
+    Args:
+        title (str): Image title
+
+    Returns:
+        str: Fingerprint, or "" if the title has no meaningful words
+    """
+    title = _TITLE_SUFFIX.sub("", str(title or ""))
+    return " ".join(sorted(_tokens(title) - _STOPWORDS))
+
+def dedupe_images(images: list) -> list:
+    """
+    Collapse duplicate images found under different perspectives or URL variants.
+
+    Two records are the same image if their canonical URLs match, or if their
+    titles have the same fingerprint and their URLs end in the same
+    distinctive file name (the same photo re-hosted on another CDN host;
+    generic names such as ``1.jpg`` or ``image.jpg`` do not count). The highest
+    resolution record of each group is kept, extended with:
+    - ``perspectives``: every ``perspective_query`` that found the image
+    - ``duplicates``: how many records were merged into it
+
+    Args:
+        images (list): Image objects from the actor
+
+    Returns:
+        list: One record per distinct image, in order of first appearance
+    """
+    groups = []
+    group_of = {}
+    for img in images:
+        url = canonical_url(img.get('link', '')) if img.get('link') else None
+        fingerprint = title_fingerprint(img.get('title', ''))
+        filename = url.split("?")[0].rsplit("/", 1)[-1] if url else ""
+        keys = [('url', url)] if url else []
+        if fingerprint and not _GENERIC_FILENAME.match(filename.rsplit(".", 1)[0]):
+            keys.append(('title', fingerprint, filename))
+
+        index = next((group_of[key] for key in keys if key in group_of), None)
+        if index is None:
+            index = len(groups)
+            groups.append([])
+        groups[index].append(img)
+        for key in keys:
+            group_of.setdefault(key, index)
+
+    unique = []
+    for group in groups:
+        best = max(group, key=_area)
+        perspectives = list(dict.fromkeys(
+            img['perspective_query'] for img in group if img.get('perspective_query')
+        ))
+        unique.append(dict(best, perspectives=perspectives, duplicates=len(group) - 1))
+    return unique
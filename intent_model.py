@@ -0,0 +1,313 @@
+"""
+Lightweight visual-intent classifier trained from ``process_query`` logs.
+
+A logistic-regression model over hashed character n-grams, implemented in
+pure NumPy so that both training and inference run offline on CPU. A trained
+model serializes to a single compressed ``.npz`` file and plugs into
+``LangChainApifyAssistant(intent_classifiers=[IntentModel.load(path)])`` as a
+local tier in front of the Gemini YES/NO prompt.
+
+Usage:
+    python intent_model.py train queries.jsonl -o intent_model.npz
+    python intent_model.py benchmark queries.jsonl -m intent_model.npz [--gemini-key KEY]
+
+The log is JSON Lines, one record per processed query, with a ``query`` field
+and a ``needs_images`` label (``image_aware_response`` is accepted as a
+fallback, so raw ``process_query`` results can be used directly).
+"""
+import argparse
+import json
+import time
+import zlib
+
+import numpy as np
+
+from cache import normalize_query
+
+def load_training_log(path: str) -> tuple:
+    """
+    Read queries and needs-images labels from a JSON Lines log.
+
+    Args:
+        path (str): Path to the log file
+
+    Returns:
+        tuple: ``(queries, labels)`` as a list of str and a list of bool.
+            Records without a query or label are skipped.
+    """
+    queries, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            label = record.get('needs_images', record.get('image_aware_response'))
+            if record.get('query') and label is not None:
+                queries.append(record['query'])
+                labels.append(bool(label))
+    return queries, labels
+
+class IntentModel:
+    """
+    Hashed character n-gram logistic regression for "does this query need images?".
+
+    Queries are normalized, padded with spaces and split into character
+    n-grams, which are hashed (CRC32, stable across processes) into a fixed
+    number of buckets and L2-normalized. Inference is a sparse dot product,
+    so it costs microseconds per query.
+
+    Attributes:
+        weights (np.ndarray): One weight per hash bucket
+        bias (float): Intercept
+        ngram_range (tuple): Smallest and largest n-gram length
+        threshold (float): Probability needed for ``classify`` to answer
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, ngram_range: tuple = (2, 4),
+                 threshold: float = 0.9):
+        """
+        Create an untrained model.
+
+        Args:
+            n_features (int, optional): Number of hash buckets. Defaults to 2**18.
+            ngram_range (tuple, optional): Inclusive n-gram length range. Defaults to (2, 4).
+            threshold (float, optional): Confidence required by ``classify``. Defaults to 0.9.
+        """
+        self.weights = np.zeros(n_features, dtype=np.float32)
+        self.bias = 0.0
+        self.ngram_range = tuple(ngram_range)
+        self.threshold = threshold
+
+    @property
+    def n_features(self) -> int:
+        return self.weights.shape[0]
+
+    def fit(self, queries: list, labels: list, epochs: int = 60, learning_rate: float = 0.5,
+            l2: float = 1e-5):
+        """
+        Train with full-batch AdaGrad on the logistic loss.
+
+        Args:
+            queries (list of str): Training queries
+            labels (list of bool): Whether each query needs images
+            epochs (int, optional): Passes over the data. Defaults to 60.
+            learning_rate (float, optional): AdaGrad step size. Defaults to 0.5.
+            l2 (float, optional): L2 regularization strength. Defaults to 1e-5.
+
+        Returns:
+            IntentModel: self
+        """
+        rows, cols, values = self._featurize(queries)
+        y = np.asarray(labels, dtype=np.float64)
+        n = len(queries)
+        weights = np.zeros(self.n_features)
+        bias = 0.0
+        weight_sq = np.full(self.n_features, 1e-8)
+        bias_sq = 1e-8
+        for _ in range(epochs):
+            scores = np.bincount(rows, weights=weights[cols] * values, minlength=n) + bias
+            error = _sigmoid(scores) - y
+            grad = np.bincount(cols, weights=error[rows] * values, minlength=self.n_features) / n
+            grad += l2 * weights
+            bias_grad = error.mean()
+            weight_sq += grad * grad
+            bias_sq += bias_grad * bias_grad
+            weights -= learning_rate * grad / np.sqrt(weight_sq)
+            bias -= learning_rate * bias_grad / np.sqrt(bias_sq)
+        self.weights = weights.astype(np.float32)
+        self.bias = float(bias)
+        return self
+
+    def predict_proba(self, queries: list) -> np.ndarray:
+        """
+        Estimate P(needs images) for a batch of queries.
+
+        Args:
+            queries (list of str): Queries to score
+
+        Returns:
+            np.ndarray: One probability per query
+        """
+        rows, cols, values = self._featurize(queries)
+        scores = np.bincount(rows, weights=self.weights[cols] * values, minlength=len(queries))
+        return _sigmoid(scores + self.bias)
+
+    def predict(self, query: str) -> float:
+        """
+        Estimate P(needs images) for a single query.
+
+        Args:
+            query (str): Query to score
+
+        Returns:
+            float: Probability in [0, 1]
+        """
+        cols, values = self._query_features(query)
+        return float(_sigmoid(self.weights[cols] @ values + self.bias))
+
+    def classify(self, query: str):
+        """
+        Decide a query locally when the model is confident enough.
+
+        Args:
+            query (str): User query
+
+        Returns:
+            bool or None: The decision, or None to defer to the next tier
+        """
+        probability = self.predict(query)
+        if probability >= self.threshold:
+            return True
+        if probability <= 1.0 - self.threshold:
+            return False
+        return None
+
+    def save(self, path: str):
+        """
+        Write the model to a compressed ``.npz`` file.
+
+        Weights are stored as float16 and mostly zero, so files stay small.
+
+        Args:
+            path (str): Destination path
+        """
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float16),
+            bias=np.float64(self.bias),
+            ngram_range=np.asarray(self.ngram_range),
+            threshold=np.float64(self.threshold)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentModel":
+        """
+        Load a model written by ``save``.
+
+        Args:
+            path (str): Model file path
+
+        Returns:
+            IntentModel: The loaded model
+        """
+        with np.load(path) as data:
+            model = cls(
+                n_features=data['weights'].shape[0],
+                ngram_range=tuple(int(n) for n in data['ngram_range']),
+                threshold=float(data['threshold'])
+            )
+            model.weights = data['weights'].astype(np.float32)
+            model.bias = float(data['bias'])
+        return model
+
+    def _query_features(self, query: str) -> tuple:
+        """Hash a query's n-grams into bucket indices with L2-normalized counts."""
+        text = f" {normalize_query(query)} "
+        low, high = self.ngram_range
+        buckets = [
+            zlib.crc32(text[i:i + n].encode("utf-8")) % self.n_features
+            for n in range(low, high + 1)
+            for i in range(len(text) - n + 1)
+        ]
+        cols, counts = np.unique(np.asarray(buckets, dtype=np.int64), return_counts=True)
+        values = counts.astype(np.float64)
+        norm = np.sqrt(values @ values)
+        return cols, values / norm if norm else values
+
+    def _featurize(self, queries: list) -> tuple:
+        """Build a sparse (rows, cols, values) matrix for a batch of queries."""
+        features = [self._query_features(query) for query in queries]
+        rows = np.repeat(np.arange(len(features)), [len(cols) for cols, _ in features])
+        if not features:
+            return rows, np.zeros(0, dtype=np.int64), np.zeros(0)
+        cols = np.concatenate([cols for cols, _ in features])
+        values = np.concatenate([values for _, values in features])
+        return rows, cols, values
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30.0, 30.0)))
+
+def _split(queries: list, labels: list, holdout: float, seed: int = 0) -> tuple:
+    """Shuffle and split into train and held-out sets."""
+    order = np.random.default_rng(seed).permutation(len(queries))
+    cut = int(len(order) * (1.0 - holdout))
+    pick = lambda idx, seq: [seq[i] for i in idx]
+    return (pick(order[:cut], queries), pick(order[:cut], labels),
+            pick(order[cut:], queries), pick(order[cut:], labels))
+
+def _evaluate(decide, queries: list, labels: list) -> dict:
+    """Measure accuracy, coverage and per-query latency of a decision function."""
+    decided = correct = 0
+    latencies = []
+    for query, label in zip(queries, labels):
+        start = time.perf_counter()
+        decision = decide(query)
+        latencies.append(time.perf_counter() - start)
+        if decision is not None:
+            decided += 1
+            correct += decision == label
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'queries': len(queries),
+        'coverage': decided / len(queries) if queries else 0.0,
+        'accuracy': correct / decided if decided else 0.0,
+        'latency_ms_p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'latency_ms_p95': float(np.percentile(latencies, 95)) if len(latencies) else 0.0
+    }
+
+def _train_command(args):
+    queries, labels = load_training_log(args.log)
+    train_q, train_y, test_q, test_y = _split(queries, labels, args.holdout)
+    print(f"📚 Training on {len(train_q)} queries ({sum(train_y)} need images)...")
+    start = time.perf_counter()
+    model = IntentModel(n_features=args.features, threshold=args.threshold)
+    model.fit(train_q, train_y, epochs=args.epochs)
+    print(f"✅ Trained in {time.perf_counter() - start:.2f}s")
+    if test_q:
+        accuracy = float(np.mean((model.predict_proba(test_q) >= 0.5) == np.asarray(test_y)))
+        print(f"🎯 Held-out accuracy on {len(test_q)} queries: {accuracy:.3f}")
+    model.save(args.output)
+    print(f"💾 Saved model to {args.output}")
+
+def _benchmark_command(args):
+    queries, labels = load_training_log(args.log)
+    _, _, test_q, test_y = _split(queries, labels, args.holdout)
+    model = IntentModel.load(args.model)
+    report = {
+        'model_forced': _evaluate(lambda q: model.predict(q) >= 0.5, test_q, test_y),
+        'model_tier': _evaluate(model.classify, test_q, test_y)
+    }
+    if args.gemini_key:
+        from main import LangChainApifyAssistant
+        assistant = LangChainApifyAssistant(args.gemini_key, apify_token="", verbose=False)
+        sample_q, sample_y = test_q[:args.llm_sample], test_y[:args.llm_sample]
+        report['llm_prompt'] = _evaluate(assistant.should_search_images, sample_q, sample_y)
+        assistant.close()
+    print(json.dumps(report, indent=2))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and benchmark the local visual-intent classifier.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train = commands.add_parser("train", help="train a model from a JSON Lines query log")
+    train.add_argument("log", help="JSON Lines log with query and needs_images fields")
+    train.add_argument("-o", "--output", default="intent_model.npz", help="model file to write")
+    train.add_argument("--features", type=int, default=2 ** 18, help="number of hash buckets")
+    train.add_argument("--epochs", type=int, default=60, help="training passes")
+    train.add_argument("--threshold", type=float, default=0.9, help="confidence for local decisions")
+    train.add_argument("--holdout", type=float, default=0.2, help="fraction held out for evaluation")
+    train.set_defaults(handler=_train_command)
+
+    bench = commands.add_parser("benchmark", help="compare model accuracy and latency with the LLM prompt")
+    bench.add_argument("log", help="JSON Lines log with query and needs_images fields")
+    bench.add_argument("-m", "--model", default="intent_model.npz", help="trained model file")
+    bench.add_argument("--holdout", type=float, default=0.2, help="held-out fraction (must match training)")
+    bench.add_argument("--gemini-key", help="also benchmark the Gemini YES/NO prompt")
+    bench.add_argument("--llm-sample", type=int, default=100, help="queries sent to the LLM")
+    bench.set_defaults(handler=_benchmark_command)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,221 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import re
+import threading
+import time
+from collections import deque
+
 from langchain_google_genai import ChatGoogleGenerativeAI
-from apify_client import ApifyClient
+from apify_client import ApifyClient, ApifyClientAsync
 import json
 
+from cache import normalize_query, search_cache_key
+from concurrency import SingleFlight
+from context import ImageContextBuilder, estimate_tokens
+from images import dedupe_images, rank_images
+from metrics import (QueryMetrics, current as current_metrics, record_bytes, record_cache, record_count,
+                     record_llm_call, stage)
+from ratelimit import BackendLimiter, is_rate_limited, throttle
+
+# Answer lines in a batched classifier reply: "3. YES" / "3) no" / bare "YES"
+_NUMBERED_ANSWER = re.compile(r"^\W*(\d+)\s*[.):-]?\s*\W*(YES|NO)\b", re.IGNORECASE)
+_BARE_ANSWER = re.compile(r"^\W*(YES|NO)\W*$", re.IGNORECASE)
+
+# Per-task concurrency limits installed by the batch API (None = unlimited)
+_LLM_SLOTS = contextvars.ContextVar("llm_slots", default=None)
+_APIFY_SLOTS = contextvars.ContextVar("apify_slots", default=None)
+
+@contextlib.asynccontextmanager
+async def _slot(slots: contextvars.ContextVar):
+    """Hold one slot of the semaphore in ``slots`` for the current task, if any."""
+    semaphore = slots.get()
+    if semaphore is None:
+        yield
+    else:
+        async with semaphore:
+            yield
+
+def _run_field(run, name: str):
+    """
+    Read a field of an Apify run by its API name (e.g. ``defaultDatasetId``).
+
+    apify-client 1.x/2.x return runs as dicts; 3.x returns pydantic models
+    whose attributes are the snake_case names (``default_dataset_id``).
+    """
+    if run is None:
+        return None
+    if isinstance(run, dict):
+        return run.get(name)
+    return getattr(run, re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower(), None)
+
+async def _anext(agen):
+    """Coroutine wrapper around ``agen.__anext__()`` (``anext`` needs Python 3.10)."""
+    return await agen.__anext__()
+
+class _Deadline:
+    """
+    Latency budget for one query, shared out across pipeline stages.
+    
+    ``seconds=None`` means no deadline: every timeout is None (unbounded).
+    """
+    
+    def __init__(self, seconds: float = None):
+        self.seconds = seconds
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self.degraded = False
+    
+    def remaining(self, reserve: float = 0.0):
+        """Seconds left, minus ``reserve`` (a fraction of the whole budget) held back for later stages."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic() - reserve * self.seconds)
+    
+    def share(self, fraction: float):
+        """Timeout for a stage allowed ``fraction`` of the whole budget (capped by what is left)."""
+        if self.expires_at is None:
+            return None
+        return min(self.remaining(), fraction * self.seconds)
+
+class StageProfile:
+    """
+    Model and generation settings for one pipeline stage.
+    
+    The one-word YES/NO classifier and the long-form answer have very
+    different needs: the classifier can run on the fastest model with a
+    couple of output tokens and a short timeout, while generation wants the
+    best model with room to write.
+    
+    Attributes:
+        model (str): Gemini model name
+        max_output_tokens (int): Output token cap (None = model default)
+        temperature (float): Sampling temperature (None = model default)
+        timeout (float): Request timeout in seconds (None = client default)
+    """
+    
+    def __init__(self, model: str = "gemini-2.0-flash", max_output_tokens: int = None,
+                 temperature: float = None, timeout: float = None):
+        """
+        Define a stage profile.
+        
+        Args:
+            model (str, optional): Gemini model name. Defaults to "gemini-2.0-flash".
+            max_output_tokens (int, optional): Output token cap. Defaults to None.
+            temperature (float, optional): Sampling temperature. Defaults to None.
+            timeout (float, optional): Request timeout in seconds. Defaults to None.
+        """
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+    
+    def replace(self, **changes) -> "StageProfile":
+        """Return a copy of this profile with some settings changed."""
+        settings = dict(vars(self), **changes)
+        return StageProfile(**settings)
+    
+    def build(self, gemini_key: str) -> ChatGoogleGenerativeAI:
+        """
+        Create a chat model configured by this profile.
+        
+        Args:
+            gemini_key (str): Google API key for Gemini model access
+            
+        Returns:
+            ChatGoogleGenerativeAI: The configured model
+        """
+        options = {
+            name: value for name, value in vars(self).items()
+            if name != 'model' and value is not None
+        }
+        return ChatGoogleGenerativeAI(model=self.model, google_api_key=gemini_key, **options)
+    
+    def __repr__(self):
+        settings = ", ".join(f"{name}={value!r}" for name, value in vars(self).items())
+        return f"StageProfile({settings})"
+
+# Default profiles: a capped, deterministic classifier and an uncapped answer model
+CLASSIFIER_PROFILE = StageProfile(max_output_tokens=3, temperature=0.0, timeout=15.0)
+GENERATION_PROFILE = StageProfile()
+
+class SpeculationPolicy:
+    """
+    Budget for speculative image searches started before classification.
+    
+    Speculation saves a full LLM round trip on visual queries, but every
+    speculative run for a query the classifier rejects is wasted actor spend.
+    This policy caps that waste: once ``max_wasted_runs`` speculative runs have
+    been wasted within the last ``window_seconds``, further queries fall back
+    to the sequential classify-then-search flow until old waste ages out.
+    
+    Runs still awaiting their classification count against the budget too
+    (``allow`` reserves a slot that ``record`` or ``release`` settles), so
+    concurrent queries cannot all pass the check before any waste is recorded.
+    
+    Attributes:
+        max_wasted_runs (int): Wasted runs allowed per rolling window
+        window_seconds (float): Length of the rolling window in seconds
+        speculative_runs (int): Total speculative searches started
+        wasted_runs (int): Total speculative searches discarded after a NO
+    """
+    
+    def __init__(self, max_wasted_runs: int = 10, window_seconds: float = 3600.0):
+        """
+        Initialize the speculation budget.
+        
+        Args:
+            max_wasted_runs (int, optional): Wasted runs allowed per window. Defaults to 10.
+            window_seconds (float, optional): Rolling window length. Defaults to one hour.
+        """
+        self.max_wasted_runs = max_wasted_runs
+        self.window_seconds = window_seconds
+        self.speculative_runs = 0
+        self.wasted_runs = 0
+        self._wasted_at = deque()
+        self._pending = 0
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """
+        Reserve a speculative search if it fits in the waste budget.
+        
+        Every True must be settled with ``record`` or ``release``.
+        
+        Returns:
+            bool: True if the search may start
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            if len(self._wasted_at) + self._pending >= self.max_wasted_runs:
+                return False
+            self._pending += 1
+            return True
+    
+    def record(self, wasted: bool):
+        """
+        Record the outcome of one speculative search reserved by ``allow``.
+        
+        Args:
+            wasted (bool): True if the classifier said NO and the run was discarded
+        """
+        with self._lock:
+            self._pending -= 1
+            self.speculative_runs += 1
+            if wasted:
+                self.wasted_runs += 1
+                self._wasted_at.append(time.monotonic())
+    
+    def release(self):
+        """Give back a reservation from ``allow`` whose search ended without a decision."""
+        with self._lock:
+            self._pending -= 1
+    
+    def _expire(self, now: float):
+        """Drop wasted-run timestamps that fell out of the rolling window."""
+        while self._wasted_at and now - self._wasted_at[0] > self.window_seconds:
+            self._wasted_at.popleft()
+
 class LangChainApifyAssistant:
     """
     LangChain LLM + Apify Actor integration with image-aware responses.
@@ -12,31 +226,181 @@ class LangChainApifyAssistant:
     2. Search for real images from the web using Apify Actor
     3. Generate text responses that incorporate found image data
     
+    The pipeline is implemented natively on asyncio (``aprocess_query`` and
+    its ``a*`` stage methods); the synchronous methods are thin wrappers that
+    run the async twins on a private background event loop, so a single loop
+    can serve many concurrent queries.
+    
     Attributes:
-        llm (ChatGoogleGenerativeAI): LangChain Gemini model instance
-        apify_client (ApifyClient): Apify client for running actors
+        llm (ChatGoogleGenerativeAI): LangChain Gemini model used for answer generation
+        classifier_llm (ChatGoogleGenerativeAI): Gemini model used for YES/NO classification
+        apify_client (ApifyClient): Sync Apify client, unused by the pipeline; kept
+            only for backward compatibility with code that reads it
+        apify_client_async (ApifyClientAsync): Async Apify client used by the pipeline
+        speculative (bool): Whether ``process_query`` speculates by default
+        speculation_policy (SpeculationPolicy): Cap on wasted speculative actor runs
+        verbose (bool): Whether progress messages are printed
+        decision_cache (LRUDecisionCache): Optional cache of YES/NO decisions
+        intent_classifiers (list): Local tiers consulted before the classifier LLM
+        search_cache (SQLiteSearchCache): Optional durable cache of image search results
+        search_flight (SingleFlight): Coalesces identical in-flight searches (None if disabled)
+        context_builder (ImageContextBuilder): Renders image context within a token budget
+        image_ranker (callable): Picks which images go into the prompt (None = actor order)
+        deduplicate (bool): Whether search results are collapsed to one record per image
+        downloader (ImageDownloader): Optional fetch stage attaching ``local_path`` to images
+        metrics_callbacks (list): Called with ``(query, metrics)`` after every query
     """
     
-    def __init__(self, gemini_key: str, apify_token: str):
+    ACTOR_ID = "loongnian714/ai-query-based-image-finder"
+    
+    # How a ``deadline`` is shared out: classification may use at most this
+    # fraction of the budget, and search must leave this fraction for generation
+    DEADLINE_CLASSIFICATION_SHARE = 0.15
+    DEADLINE_GENERATION_RESERVE = 0.45
+    
+    # Tool schema exposing the image search to the chat model in agent mode
+    SEARCH_IMAGES_TOOL = {
+        "name": "search_images",
+        "description": (
+            "Search the web for real (non AI-generated) images. Call this only when "
+            "seeing actual images would materially improve the answer, e.g. products, "
+            "places, designs or what something looks like."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Image search query describing what should be shown"
+                }
+            },
+            "required": ["query"]
+        }
+    }
+    
+    # Actor run statuses after which no more results will appear
+    TERMINAL_RUN_STATUSES = frozenset({'SUCCEEDED', 'FAILED', 'ABORTED', 'TIMED-OUT'})
+    
+    # Fields of the actor's result item that the pipeline reads
+    SEARCH_RESULT_FIELDS = ('images', 'search_perspectives', 'total_results', 'agent_response')
+    
+    def __init__(self, gemini_key: str, apify_token: str, speculative: bool = False,
+                 speculation_policy: SpeculationPolicy = None, verbose: bool = True,
+                 decision_cache=None, intent_classifiers: list = None, search_cache=None,
+                 coalesce_searches: bool = True, classifier_profile: StageProfile = None,
+                 generation_profile: StageProfile = None, context_builder: ImageContextBuilder = None,
+                 image_ranker=rank_images, deduplicate: bool = True, downloader=None,
+                 llm=None, classifier_llm=None, apify_client_async=None,
+                 metrics_callbacks: list = None, classifier_limiter: BackendLimiter = None,
+                 generation_limiter: BackendLimiter = None, actor_limiter: BackendLimiter = None):
         """
         Initialize the LangChain + Apify integration.
         
         Args:
             gemini_key (str): Google API key for Gemini model access
             apify_token (str): Apify API token for actor execution
+            speculative (bool, optional): Start image searches in parallel with
+                classification by default. Defaults to False.
+            speculation_policy (SpeculationPolicy, optional): Budget for wasted
+                speculative runs. Defaults to ``SpeculationPolicy()``.
+            verbose (bool, optional): Print progress messages. Defaults to True.
+            decision_cache (optional): Cache consulted before the classifier LLM,
+                e.g. ``cache.LRUDecisionCache()``. Any object with
+                ``get(key)``/``set(key, decision)`` works. Defaults to None (no caching).
+            intent_classifiers (list, optional): Local classifiers tried in order
+                before the Gemini YES/NO prompt, e.g.
+                ``[classifier.RuleBasedIntentClassifier()]``. Each exposes
+                ``classify(query)`` returning True/False, or None when unsure.
+                Defaults to None (always ask the LLM).
+            search_cache (optional): Cache of Apify results keyed by normalized
+                query and ``max_results``, e.g. ``cache.SQLiteSearchCache()``.
+                Defaults to None (every search runs the actor).
+            coalesce_searches (bool, optional): Share one actor run among
+                concurrent searches for the same query and ``max_results``.
+                Defaults to True.
+            classifier_profile (StageProfile, optional): Model settings for the
+                YES/NO classifier. Defaults to ``CLASSIFIER_PROFILE``.
+            generation_profile (StageProfile, optional): Model settings for answer
+                generation. Defaults to ``GENERATION_PROFILE``.
+            context_builder (ImageContextBuilder, optional): Token-budgeted image
+                context renderer for the generation prompt. Defaults to
+                ``ImageContextBuilder()`` (800 tokens, at most 5 images).
+            image_ranker (callable, optional): ``ranker(query, images, k=...)``
+                choosing the images described in the prompt. Defaults to
+                ``images.rank_images`` (diversity-aware MMR); None keeps the
+                actor's order.
+            deduplicate (bool, optional): Collapse search results that are the
+                same image (URL variants, or one photo found by several
+                perspectives) into one record listing every perspective that
+                found it. Defaults to True.
+            downloader (optional): Fetch stage run on the images of every
+                ``process_query`` result, concurrently with answer generation,
+                e.g. ``downloads.ImageDownloader("./images")``. Any object with
+                ``afetch(images)`` returning the images with ``local_path``
+                works. Defaults to None (remote URLs only).
+            llm (optional): Chat model to use for generation instead of one built
+                from ``generation_profile``, e.g. a stand-in from ``benchmarks``.
+                It needs ``ainvoke``, ``astream`` and, for agent mode, ``bind_tools``.
+                Defaults to None.
+            classifier_llm (optional): Chat model to use for (batched)
+                classification instead of one built from ``classifier_profile``.
+                Defaults to None.
+            apify_client_async (optional): Async Apify client to use instead of
+                ``ApifyClientAsync(apify_token)``. Defaults to None.
+            metrics_callbacks (list, optional): Functions called as
+                ``callback(query, metrics)`` with the ``metrics`` of every
+                processed query (with an ``error`` entry if it failed), e.g. to
+                feed a monitoring system. Defaults to None.
+            classifier_limiter (BackendLimiter, optional): Request/token rate and
+                adaptive concurrency limits for classifier calls, e.g.
+                ``BackendLimiter("classifier", requests_per_minute=2000)``.
+                Defaults to None (unlimited).
+            generation_limiter (BackendLimiter, optional): Limits for answer
+                generation and agent-mode calls. Defaults to None (unlimited).
+            actor_limiter (BackendLimiter, optional): Limits for Apify actor runs;
+                ``max_concurrency`` bounds the runs in progress. Defaults to None (unlimited).
             
         Raises:
             Exception: If API keys are invalid or services are unavailable
         """
-        # Initialize LangChain LLM
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            google_api_key=gemini_key
-        )
+        self.verbose = verbose
+        self.decision_cache = decision_cache
+        self.intent_classifiers = list(intent_classifiers or [])
+        self.search_cache = search_cache
+        self.search_flight = SingleFlight(on_complete=self._log_coalesced_search) if coalesce_searches else None
+        self.context_builder = context_builder or ImageContextBuilder()
+        self.image_ranker = image_ranker
+        self.deduplicate = deduplicate
+        self.downloader = downloader
+        self.metrics_callbacks = list(metrics_callbacks or [])
+        self.classifier_limiter = classifier_limiter
+        self.generation_limiter = generation_limiter
+        self.actor_limiter = actor_limiter
+        self._agent_llm = None
+        self._background_tasks = set()
+        
+        # Initialize LangChain LLMs, one per stage profile
+        self.classifier_profile = classifier_profile or CLASSIFIER_PROFILE
+        self.generation_profile = generation_profile or GENERATION_PROFILE
+        self.llm = llm or self.generation_profile.build(gemini_key)
+        self.classifier_llm = classifier_llm or self.classifier_profile.build(gemini_key)
+        # Batched classification answers many queries at once, so lift the token cap
+        self.batch_classifier_llm = classifier_llm or self.classifier_profile.replace(max_output_tokens=None).build(gemini_key)
         
-        # Initialize Apify client
+        # Initialize the Apify client used by the pipeline. The sync client is
+        # only kept for backward compatibility: nothing here calls it any more
         self.apify_client = ApifyClient(apify_token)
-        print("✅ LangChain + Apify integration ready!")
+        self.apify_client_async = apify_client_async or ApifyClientAsync(apify_token)
+        
+        # Speculative search settings
+        self.speculative = speculative
+        self.speculation_policy = speculation_policy or SpeculationPolicy()
+        
+        # Background event loop backing the synchronous wrappers
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+        self._log("✅ LangChain + Apify integration ready!")
     
     def should_search_images(self, query: str) -> bool:
         """
@@ -57,14 +421,202 @@ class LangChainApifyAssistant:
             >>> assistant.should_search_images("Tesla Model Y interior")
             True
         """
-        prompt = f"""
+        return self._run_sync(self.ashould_search_images(query))
+    
+    async def ashould_search_images(self, query: str) -> bool:
+        """
+        Async twin of ``should_search_images`` built on ``llm.ainvoke``.
+        
+        Args:
+            query (str): User's input query to analyze
+            
+        Returns:
+            bool: True if images would enhance the response, False otherwise
+            
+        Note:
+            Decisions are made by the first confident tier: the ``decision_cache``
+            (repeated queries), then each of ``intent_classifiers`` in order,
+            and finally the Gemini prompt. Tiers that expose
+            ``observe(query, decision)`` learn from every LLM decision.
+        """
+        with stage('classification'):
+            decision = self._local_decision(query)
+            if decision is not None:
+                return decision
+            
+            prompt = self._build_classification_prompt(query)
+            tokens = self._call_tokens(prompt, self.classifier_profile)
+            async with _slot(_LLM_SLOTS), throttle(self.classifier_limiter, tokens) as permit:
+                response = await self.classifier_llm.ainvoke(prompt)
+                permit.record_usage(response)
+            record_llm_call(response, prompt)
+            record_cache('decision', 'llm')
+            decision = self._parse_decision(response.content)
+        
+        self._record_decision(query, decision)
+        return decision
+    
+    def should_search_images_batch(self, queries: list, batch_size: int = 25) -> list:
+        """
+        Classify many queries with one LLM call per ``batch_size`` queries.
+        
+        Queries answered by the decision cache or a local tier never reach the
+        LLM. The rest are packed into a numbered prompt that asks for one
+        YES/NO line per query. Any query whose answer is missing or cannot be
+        parsed falls back to an individual ``should_search_images`` call.
+        
+        Args:
+            queries (list of str): Queries to classify
+            batch_size (int, optional): Queries per LLM prompt. Defaults to 25.
+            
+        Returns:
+            list of bool: One decision per query, in input order
+            
+        Example:
+            >>> assistant.should_search_images_batch(["What is Python?", "Tesla Model Y interior"])
+            [False, True]
+        """
+        return self._run_sync(self.ashould_search_images_batch(queries, batch_size))
+    
+    async def ashould_search_images_batch(self, queries: list, batch_size: int = 25) -> list:
+        """
+        Async twin of ``should_search_images_batch``; batches run concurrently.
+        
+        Args:
+            queries (list of str): Queries to classify
+            batch_size (int, optional): Queries per LLM prompt. Defaults to 25.
+            
+        Returns:
+            list of bool: One decision per query, in input order
+        """
+        decisions = [self._local_decision(query) for query in queries]
+        undecided = [i for i, decision in enumerate(decisions) if decision is None]
+        batches = [undecided[i:i + batch_size] for i in range(0, len(undecided), batch_size)]
+        
+        answers = await asyncio.gather(*(
+            self._aclassify_batch([queries[i] for i in batch]) for batch in batches
+        ))
+        for batch, batch_answers in zip(batches, answers):
+            for i, decision in zip(batch, batch_answers):
+                decisions[i] = decision
+        return decisions
+    
+    async def _aclassify_batch(self, queries: list) -> list:
+        """Classify one batch with a single LLM call, falling back per query."""
+        if len(queries) == 1:
+            return [await self.ashould_search_images(queries[0])]
+        
+        prompt = self._build_batch_classification_prompt(queries)
+        # About four tokens per numbered YES/NO answer line
+        tokens = estimate_tokens(prompt) + 4 * len(queries)
+        try:
+            async with _slot(_LLM_SLOTS), throttle(self.classifier_limiter, tokens) as permit:
+                response = await self.batch_classifier_llm.ainvoke(prompt)
+                permit.record_usage(response)
+        except Exception as e:
+            if is_rate_limited(e):
+                # Fanning out would turn one throttled call into one per query
+                raise
+            # One failed call must not fail the whole batch: classify each query on its own
+            self._log(f"⚠️ Batch classifier failed ({e}); classifying {len(queries)} queries individually")
+            decisions = [None] * len(queries)
+        else:
+            decisions = self._parse_batch_decisions(response.content, len(queries))
+        
+        missing = [i for i, decision in enumerate(decisions) if decision is None]
+        if missing and len(missing) < len(queries):
+            self._log(f"⚠️ Batch classifier answered {len(queries) - len(missing)}/{len(queries)}; retrying the rest individually")
+        for i, decision in enumerate(decisions):
+            if decision is not None:
+                self._record_decision(queries[i], decision)
+        fallback = await asyncio.gather(*(self.ashould_search_images(queries[i]) for i in missing))
+        for i, decision in zip(missing, fallback):
+            decisions[i] = decision
+        return decisions
+    
+    def _local_decision(self, query: str):
+        """Answer from the decision cache or a local tier; None if the LLM is needed."""
+        if self.decision_cache is not None:
+            decision = self.decision_cache.get(normalize_query(query))
+            if decision is not None:
+                record_cache('decision', 'cache')
+                return decision
+        
+        for tier in self.intent_classifiers:
+            decision = tier.classify(query)
+            if decision is not None:
+                record_cache('decision', 'local')
+                return decision
+        return None
+    
+    def _record_decision(self, query: str, decision: bool):
+        """Feed an LLM decision back to learning tiers and the decision cache."""
+        for tier in self.intent_classifiers:
+            if hasattr(tier, 'observe'):
+                tier.observe(query, decision)
+        if self.decision_cache is not None:
+            self.decision_cache.set(normalize_query(query), decision)
+    
+    def _build_batch_classification_prompt(self, queries: list) -> str:
+        """Build a numbered multi-query YES/NO prompt."""
+        numbered = "\n".join(f'{i}. "{query}"' for i, query in enumerate(queries, 1))
+        return f"""
+For each numbered query below, decide whether it needs visual images to answer properly.
+
+{numbered}
+
+Reply with exactly {len(queries)} lines, one per query, in the form "<number>. YES" or "<number>. NO".
+Do not add any other text.
+"""
+    
+    @staticmethod
+    def _parse_batch_decisions(content: str, count: int) -> list:
+        """
+        Parse a batched classifier reply.
+        
+        Numbered lines are matched to queries by number. A reply without numbers
+        is accepted positionally only if it has exactly ``count`` YES/NO lines.
+        
+        Returns:
+            list: ``count`` decisions, with None for answers that are missing,
+                out of range or contradictory
+        """
+        decisions = [None] * count
+        conflicts = set()
+        positional = []
+        for line in content.splitlines():
+            numbered = _NUMBERED_ANSWER.match(line)
+            if numbered:
+                index = int(numbered.group(1)) - 1
+                decision = numbered.group(2).upper() == "YES"
+                if 0 <= index < count:
+                    if decisions[index] not in (None, decision):
+                        conflicts.add(index)
+                    decisions[index] = decision
+                continue
+            bare = _BARE_ANSWER.match(line)
+            if bare:
+                positional.append(bare.group(1).upper() == "YES")
+        
+        if all(decision is None for decision in decisions) and len(positional) == count:
+            return positional
+        for index in conflicts:
+            decisions[index] = None
+        return decisions
+    
+    def _build_classification_prompt(self, query: str) -> str:
+        """Build the one-word YES/NO prompt used to classify a query."""
+        return f"""
 Does this query need visual images to answer properly?
 Query: "{query}"
 
 Answer only "YES" or "NO"
 """
-        response = self.llm.invoke(prompt)
-        return "YES" in response.content.upper()
+    
+    @staticmethod
+    def _parse_decision(content: str) -> bool:
+        """Interpret a classifier reply as a needs-images decision."""
+        return "YES" in content.upper()
     
     def get_text_response_with_images(self, query: str, images_data: dict = None) -> str:
         """
@@ -91,29 +643,123 @@ Answer only "YES" or "NO"
             When images_data is provided, the response will reference specific
             images found and explain how they relate to the query.
         """
+        return self._run_sync(self.aget_text_response_with_images(query, images_data))
+    
+    async def aget_text_response_with_images(self, query: str, images_data: dict = None) -> str:
+        """
+        Async twin of ``get_text_response_with_images`` built on ``llm.ainvoke``.
+        
+        Args:
+            query (str): Original user query
+            images_data (dict, optional): Image search results from Apify Actor
+            
+        Returns:
+            str: Generated text response, enhanced with image context if available
+        """
+        prompt = self._build_response_prompt(query, images_data)
+        with stage('generation'):
+            tokens = self._call_tokens(prompt, self.generation_profile)
+            async with _slot(_LLM_SLOTS), throttle(self.generation_limiter, tokens) as permit:
+                response = await self.llm.ainvoke(prompt)
+                permit.record_usage(response)
+        record_llm_call(response, prompt)
+        return response.content
+    
+    def stream_text_response_with_images(self, query: str, images_data: dict = None):
+        """
+        Streaming variant of ``get_text_response_with_images``.
+        
+        Uses the same prompts, but yields text as the model produces it instead
+        of waiting for the whole answer.
+        
+        Args:
+            query (str): Original user query
+            images_data (dict, optional): Image search results from Apify Actor
+            
+        Yields:
+            str: Successive pieces of the generated response
+            
+        Example:
+            >>> for text in assistant.stream_text_response_with_images("What is Python?"):
+            ...     print(text, end='', flush=True)
+        """
+        return self._iter_sync(self.astream_text_response_with_images(query, images_data))
+    
+    async def astream_text_response_with_images(self, query: str, images_data: dict = None):
+        """
+        Async twin of ``stream_text_response_with_images`` built on ``llm.astream``.
+        
+        Args:
+            query (str): Original user query
+            images_data (dict, optional): Image search results from Apify Actor
+            
+        Yields:
+            str: Successive pieces of the generated response
+        """
+        prompt = self._build_response_prompt(query, images_data)
+        record_llm_call(prompt=prompt)
+        # Steps of an async generator may run in different contexts: hold on to the metrics
+        tracked = current_metrics()
+        tokens = self._call_tokens(prompt, self.generation_profile)
+        pieces = asyncio.Queue()
+        
+        async def read_stream():
+            # Read the model at its own pace: a slow consumer must neither hold the
+            # rate limiter's slot nor count towards the backend's latency
+            async with _slot(_LLM_SLOTS), throttle(self.generation_limiter, tokens) as permit:
+                async for chunk in self.llm.astream(prompt):
+                    permit.record_usage(chunk)
+                    if tracked is not None:
+                        tracked.add_usage(chunk)
+                    if chunk.content:
+                        pieces.put_nowait(chunk.content)
+        
+        with stage('generation'):
+            reader = asyncio.ensure_future(read_stream())
+            reader.add_done_callback(lambda _: pieces.put_nowait(None))
+            try:
+                while True:
+                    piece = await pieces.get()
+                    if piece is None:
+                        break
+                    yield piece
+                reader.result()
+            finally:
+                reader.cancel()
+    
+    @staticmethod
+    def _call_tokens(prompt: str, profile: "StageProfile") -> int:
+        """Tokens to reserve with a rate limiter for one call: the prompt plus the output cap, if any."""
+        return estimate_tokens(prompt) + (profile.max_output_tokens or 0)
+    
+    def _build_response_prompt(self, query: str, images_data: dict = None) -> str:
+        """
+        Build the generation prompt, with image context when images are available.
+        
+        Args:
+            query (str): Original user query
+            images_data (dict, optional): Image search results from Apify Actor
+            
+        Returns:
+            str: Prompt for the answer-generation LLM call
+        """
         if not images_data or not images_data.get('images'):
             # No images - regular text response
             prompt = f"Answer this query comprehensively: '{query}'"
         else:
-            # WITH images - create rich context
-            images = images_data.get('images', [])
-            perspectives = images_data.get('search_perspectives', [])
-            
-            # Build image context for the LLM
-            image_context = f"""
-I found {len(images)} relevant images from {len(perspectives)} different search perspectives:
-
-SEARCH PERSPECTIVES USED:
-"""
-            for p in perspectives:
-                image_context += f"• {p.get('perspective_type', 'Unknown').title()}: '{p.get('query', 'N/A')}' ({p.get('images_found', 0)} images)\n"
-            
-            image_context += f"\nIMAGE DETAILS FOUND:\n"
-            for i, img in enumerate(images[:5]):  # Include details of first 5 images
-                image_context += f"{i+1}. Title: {img.get('title', 'Untitled')}\n"
-                image_context += f"   Source: {img.get('display_link', 'N/A')}\n"
-                image_context += f"   Perspective: {img.get('perspective_query', 'N/A')}\n"
-                image_context += f"   Size: {img.get('width', 'N/A')}x{img.get('height', 'N/A')}\n\n"
+            # WITH images - create rich context, bounded by the builder's token budget
+            with stage('context'):
+                images = images_data.get('images', [])
+                if self.image_ranker is not None:
+                    # Ranked picks first, the rest after them: the builder describes at most
+                    # max_images but reports (and counts as omitted) the full result set
+                    ranked = self.image_ranker(query, images, k=self.context_builder.max_images)
+                    picked = {id(img) for img in ranked}
+                    images = ranked + [img for img in images if id(img) not in picked]
+                image_context = self.context_builder.build(
+                    images,
+                    images_data.get('search_perspectives', [])
+                )
             
             prompt = f"""
 Answer this query comprehensively: "{query}"
@@ -131,10 +777,9 @@ Guidelines:
 Provide a detailed response that integrates both textual explanation and references to the visual content discovered.
 """
         
-        response = self.llm.invoke(prompt)
-        return response.content
+        return prompt
     
-    def search_images(self, query: str, max_results: int = 10) -> dict:
+    def search_images(self, query: str, max_results: int = 10, time_budget: float = None) -> dict:
         """
         Search for real images using the Apify Actor with multi-perspective approach.
         
@@ -146,6 +791,10 @@ Provide a detailed response that integrates both textual explanation and referen
         Args:
             query (str): Search query for finding relevant images
             max_results (int, optional): Maximum number of images to return. Defaults to 10.
+            time_budget (float, optional): Seconds to spend at most. The run is
+                polled while in progress (see ``iter_search_progress``) and
+                whatever has been found when the budget runs out is returned.
+                Defaults to None (wait for the run to finish).
             
         Returns:
             dict: Search results containing:
@@ -153,6 +802,8 @@ Provide a detailed response that integrates both textual explanation and referen
                 - search_perspectives: Different search angles used
                 - total_results: Total number of images found
                 - agent_response: Summary of search strategy
+                - duplicates_removed: Only with deduplication; records merged away
+                - partial: Only with ``time_budget``; True if the budget cut the run short
                 
         Raises:
             Exception: If Apify Actor execution fails or times out
@@ -161,17 +812,304 @@ Provide a detailed response that integrates both textual explanation and referen
             >>> results = assistant.search_images("Tesla dashboard", 5)
             >>> print(f"Found {results['total_results']} images")
         """
-        run = self.apify_client.actor("loongnian714/ai-query-based-image-finder").call(
-            run_input={
+        return self._run_sync(self.asearch_images(query, max_results, time_budget))
+    
+    async def asearch_images(self, query: str, max_results: int = 10, time_budget: float = None) -> dict:
+        """
+        Async twin of ``search_images`` built on ``ApifyClientAsync``.
+        
+        Args:
+            query (str): Search query for finding relevant images
+            max_results (int, optional): Maximum number of images to return. Defaults to 10.
+            time_budget (float, optional): Seconds to spend at most (see ``search_images``)
+            
+        Returns:
+            dict: Search results (see ``search_images``), or {} if the run produced nothing
+            
+        Note:
+            If the awaiting task is cancelled, the actor run is aborted rather
+            than left running (and billing) in the background.
+            
+            With a ``search_cache``, fresh entries are returned without running
+            the actor. Stale entries are returned immediately too, while one
+            caller (across processes) refreshes them in the background.
+            Partial (budget-limited) results are never cached.
+        """
+        with stage('search'):
+            images_data = await self._asearch_images_cached(query, max_results, time_budget)
+        record_count('images', len(images_data.get('images', [])))
+        record_count('perspectives', len(images_data.get('search_perspectives', [])))
+        record_count('duplicates_removed', images_data.get('duplicates_removed', 0))
+        return images_data
+    
+    async def _asearch_images_cached(self, query: str, max_results: int, time_budget: float = None) -> dict:
+        """The body of ``asearch_images``: serve from the search cache or run the actor."""
+        key = search_cache_key(query, max_results)
+        if self.search_cache is not None:
+            cached = await self._in_thread(self.search_cache.get, key)
+            if cached is not None:
+                images_data, fresh = cached
+                record_cache('search', 'fresh' if fresh else 'stale')
+                if not fresh:
+                    self._spawn(self._arevalidate_search(query, max_results, key))
+                return images_data
+            record_cache('search', 'miss')
+        
+        if time_budget is None:
+            images_data = await self._asearch_images_shared(query, max_results)
+        else:
+            images_data = {}
+            async for images_data in self.aiter_search_progress(query, max_results, time_budget):
+                pass
+        
+        if self.search_cache is not None and images_data and not images_data.get('partial'):
+            await self._in_thread(self.search_cache.set, key, images_data)
+        return images_data
+    
+    async def _arevalidate_search(self, query: str, max_results: int, key: str):
+        """Refresh a stale cached search if no other caller has claimed it."""
+        if not await self._in_thread(self.search_cache.claim_refresh, key):
+            return
+        self._log(f"♻️ Refreshing stale image search for '{query}'")
+        try:
+            images_data = await self._asearch_images_shared(query, max_results)
+        except Exception as e:
+            self._log(f"⚠️ Background refresh failed for '{query}': {e}")
+            return
+        if images_data:
+            await self._in_thread(self.search_cache.set, key, images_data)
+    
+    async def _asearch_images_shared(self, query: str, max_results: int) -> dict:
+        """
+        Run an uncached search, joining an identical one already in flight.
+        
+        Concurrent callers (threads or tasks) asking for the same normalized
+        query and ``max_results`` share a single actor run; the run is only
+        aborted if every one of them is cancelled.
+        """
+        if self.search_flight is None:
+            return await self._asearch_images_uncached(query, max_results)
+        return await self.search_flight.ado(
+            search_cache_key(query, max_results),
+            lambda: self._asearch_images_uncached(query, max_results)
+        )
+    
+    def _log_coalesced_search(self, key: str, callers: int):
+        """Report actor runs that served more than one caller."""
+        if callers > 1:
+            self._log(f"🤝 Apify run for '{key}' served {callers} callers")
+    
+    async def _asearch_images_uncached(self, query: str, max_results: int) -> dict:
+        """Run the actor and read its result, bypassing the search cache."""
+        run = await self._arun_actor({
+            "query": query,
+            "maxResults": max_results
+        })
+        
+        # Only the first item is used: fetch just that one, projected to the
+        # fields we read, instead of downloading and parsing the whole dataset
+        page = await self.apify_client_async.dataset(_run_field(run, 'defaultDatasetId')).list_items(
+            limit=1,
+            fields=list(self.SEARCH_RESULT_FIELDS)
+        )
+        if page.items:
+            record_bytes('search_result', len(json.dumps(page.items[0], separators=(",", ":")).encode("utf-8")))
+        images_data = self._dedupe_search_result(page.items[0] if page.items else {})
+        if images_data.get('duplicates_removed'):
+            self._log(f"🧹 Merged {images_data['duplicates_removed']} duplicate images")
+        return images_data
+    
+    def _dedupe_search_result(self, images_data: dict) -> dict:
+        """
+        Collapse duplicate images in a search result (see ``images.dedupe_images``).
+        
+        Each kept image gains ``perspectives`` (every perspective query that
+        found it) and ``duplicates``; ``total_results`` is reduced by the
+        number of records merged away, reported as ``duplicates_removed``.
+        """
+        if not self.deduplicate or not images_data.get('images'):
+            return images_data
+        images = dedupe_images(images_data['images'])
+        removed = len(images_data['images']) - len(images)
+        deduped = dict(images_data, images=images, duplicates_removed=removed)
+        deduped['total_results'] = max(images_data.get('total_results', 0) - removed, len(images))
+        return deduped
+    
+    def iter_search_progress(self, query: str, max_results: int = 10, time_budget: float = None,
+                             poll_interval: float = 1.0):
+        """
+        Start the image finder actor and yield results while it is still running.
+        
+        Instead of blocking until the run finishes, the run is started and its
+        default dataset polled. Each time new items appear, a merged snapshot
+        of everything found so far is yielded. Polling stops as soon as
+        ``max_results`` images have been found, the run finishes, or
+        ``time_budget`` runs out; an unfinished run is then aborted.
+        
+        Args:
+            query (str): Search query for finding relevant images
+            max_results (int, optional): Images wanted; reaching it ends the run early. Defaults to 10.
+            time_budget (float, optional): Seconds to wait at most. Defaults to None (no limit).
+            poll_interval (float, optional): Seconds between polls. Defaults to 1.0.
+            
+        Yields:
+            dict: Snapshots shaped like ``search_images`` results, plus
+                ``partial`` (True while more results may still come, and on
+                the final snapshot if the budget cut the run short)
+                
+        Example:
+            >>> for snapshot in assistant.iter_search_progress("Tesla dashboard", time_budget=15):
+            ...     print(f"{len(snapshot['images'])} images so far")
+        """
+        return self._iter_sync(self.aiter_search_progress(query, max_results, time_budget, poll_interval))
+    
+    async def aiter_search_progress(self, query: str, max_results: int = 10, time_budget: float = None,
+                                    poll_interval: float = 1.0):
+        """
+        Async twin of ``iter_search_progress``.
+        
+        Args:
+            query (str): Search query for finding relevant images
+            max_results (int, optional): Images wanted. Defaults to 10.
+            time_budget (float, optional): Seconds to wait at most. Defaults to None.
+            poll_interval (float, optional): Seconds between polls. Defaults to 1.0.
+            
+        Yields:
+            dict: Merged result snapshots (see ``iter_search_progress``)
+        """
+        budget = _Deadline(time_budget)
+        async with _slot(_APIFY_SLOTS), throttle(self.actor_limiter):
+            run = await self.apify_client_async.actor(self.ACTOR_ID).start(run_input={
                 "query": query,
                 "maxResults": max_results
-            }
-        )
+            })
+            run_client = self.apify_client_async.run(_run_field(run, 'id'))
+            dataset = self.apify_client_async.dataset(_run_field(run, 'defaultDatasetId'))
+            items = []
+            finished = False
+            try:
+                while True:
+                    # Check status before reading, so a finished run's items are all visible
+                    status = _run_field(await run_client.get(), 'status')
+                    finished = status in self.TERMINAL_RUN_STATUSES
+                    page = await dataset.list_items(offset=len(items))
+                    items.extend(page.items)
+                    
+                    snapshot = self._dedupe_search_result(self._merge_search_items(items, max_results))
+                    enough = len(snapshot.get('images', [])) >= max_results
+                    out_of_time = budget.remaining() == 0
+                    done = finished or enough or out_of_time
+                    if page.items or done:
+                        if snapshot:
+                            snapshot['partial'] = not (finished or enough)
+                        yield snapshot
+                    if done:
+                        break
+                    await asyncio.sleep(min(poll_interval, budget.remaining() or poll_interval))
+            finally:
+                if not finished:
+                    await self._aabort_run(_run_field(run, 'id'))
+    
+    @staticmethod
+    def _merge_search_items(items: list, max_results: int) -> dict:
+        """
+        Merge dataset items into one ``search_images``-shaped result.
+        
+        Handles both summary items (with ``images`` and ``search_perspectives``
+        lists) and items that are individual images. Once a summary item has
+        been written it is the complete result, so the image items written
+        before it are not counted again.
         
-        results = list(self.apify_client.dataset(run["defaultDatasetId"]).iterate_items())
-        return results[0] if results else {}
+        Returns:
+            dict: Merged result with at most ``max_results`` images, or {} if no items
+        """
+        if not items:
+            return {}
+        images, perspectives = [], []
+        merged = {}
+        if any('images' in item or 'search_perspectives' in item for item in items):
+            items = [item for item in items if 'images' in item or 'search_perspectives' in item]
+        for item in items:
+            if 'images' in item or 'search_perspectives' in item:
+                images.extend(item.get('images') or [])
+                perspectives.extend(item.get('search_perspectives') or [])
+                if 'agent_response' in item:
+                    merged['agent_response'] = item['agent_response']
+            elif 'link' in item:
+                images.append(item)
+        merged['images'] = images[:max_results]
+        merged['search_perspectives'] = perspectives
+        merged['total_results'] = len(merged['images'])
+        return merged
     
-    def process_query(self, query: str) -> dict:
+    def iter_search_items(self, query: str, max_results: int = 10, fields: list = None):
+        """
+        Run the image finder actor and stream every item of its dataset.
+        
+        Unlike ``search_images``, which reads only the first item, this walks the
+        whole dataset page by page without materializing it, for callers that
+        want more than the summary item.
+        
+        Args:
+            query (str): Search query for finding relevant images
+            max_results (int, optional): Maximum number of images to return. Defaults to 10.
+            fields (list, optional): Fields to keep in each item. Defaults to all fields.
+            
+        Yields:
+            dict: Dataset items, in dataset order
+            
+        Example:
+            >>> for item in assistant.iter_search_items("Tesla dashboard"):
+            ...     print(item.keys())
+        """
+        return self._iter_sync(self.aiter_search_items(query, max_results, fields))
+    
+    async def aiter_search_items(self, query: str, max_results: int = 10, fields: list = None):
+        """
+        Async twin of ``iter_search_items``.
+        
+        Args:
+            query (str): Search query for finding relevant images
+            max_results (int, optional): Maximum number of images to return. Defaults to 10.
+            fields (list, optional): Fields to keep in each item. Defaults to all fields.
+            
+        Yields:
+            dict: Dataset items, in dataset order
+        """
+        run = await self._arun_actor({
+            "query": query,
+            "maxResults": max_results
+        })
+        
+        async for item in self.apify_client_async.dataset(_run_field(run, 'defaultDatasetId')).iterate_items(fields=fields):
+            yield item
+    
+    async def _arun_actor(self, run_input: dict) -> dict:
+        """
+        Start the image finder actor and wait for it, aborting on cancellation.
+        
+        Args:
+            run_input (dict): Actor input
+            
+        Returns:
+            The finished run (a dict, or a model with apify-client 3; see ``_run_field``)
+        """
+        async with _slot(_APIFY_SLOTS), throttle(self.actor_limiter):
+            run = await self.apify_client_async.actor(self.ACTOR_ID).start(run_input=run_input)
+            try:
+                return await self.apify_client_async.run(_run_field(run, 'id')).wait_for_finish()
+            except asyncio.CancelledError:
+                await self._aabort_run(_run_field(run, 'id'))
+                raise
+    
+    async def _aabort_run(self, run_id: str):
+        """Abort an actor run; best effort, since the caller is already bailing out."""
+        try:
+            await self.apify_client_async.run(run_id).abort()
+        except Exception as e:
+            self._log(f"⚠️ Could not abort Apify run {run_id}: {e}")
+    
+    def process_query(self, query: str, speculative: bool = None, deadline: float = None) -> dict:
         """
         Main processing method: Complete LangChain + Apify workflow.
         
@@ -182,6 +1120,11 @@ Provide a detailed response that integrates both textual explanation and referen
         
         Args:
             query (str): User's input query to process
+            speculative (bool, optional): Start the image search in parallel with
+                classification (see ``aprocess_query``). Defaults to the
+                instance's ``speculative`` setting.
+            deadline (float, optional): Latency budget in seconds for the whole
+                query (see ``aprocess_query``). Defaults to None (unbounded).
             
         Returns:
             dict: Complete response containing:
@@ -191,37 +1134,721 @@ Provide a detailed response that integrates both textual explanation and referen
                 - total_images: Count of images found
                 - perspectives: Search perspectives used
                 - image_aware_response: Boolean indicating if images influenced response
+                - degraded: True if a stage was abandoned to meet the deadline
+                - metrics: Per-stage timings (``stages``: classification, search,
+                  context, generation, download, total; in seconds), ``tokens``,
+                  ``llm_calls``, ``bytes``, ``items`` and ``cache`` outcomes
+                
+        Raises:
+            TimeoutError: If the answer itself cannot be generated within ``deadline``
                 
         Example:
             >>> result = assistant.process_query("Tesla Model Y interior")
             >>> print(result['text_response'])  # Image-aware response
             >>> print(f"Found {result['total_images']} supporting images")
         """
-        print(f"\n🔍 Processing: '{query}'")
+        return self._run_sync(self.aprocess_query(query, speculative=speculative, deadline=deadline))
+    
+    async def aprocess_query(self, query: str, speculative: bool = None, needs_images: bool = None,
+                             deadline: float = None) -> dict:
+        """
+        Async twin of ``process_query``: the complete LangChain + Apify workflow.
         
-        # Step 1: LangChain decides if images are needed
-        needs_images = self.should_search_images(query)
-        print(f"🧠 LangChain analysis: {'Images needed' if needs_images else 'Text only'}")
+        Every stage awaits network I/O instead of blocking a thread, so many
+        queries can be processed concurrently on one event loop.
+        
+        In speculative mode the Apify search starts at the same time as the
+        YES/NO classification, so visual queries no longer pay both latencies
+        back to back. If the classifier answers NO, the speculative run is
+        cancelled (and aborted on Apify) and counted against
+        ``speculation_policy``; when that budget is exhausted the query runs
+        sequentially instead.
+        
+        With a ``deadline``, the budget is shared out across the stages:
+        classification may use ``DEADLINE_CLASSIFICATION_SHARE`` of it (on
+        timeout the query is treated as text-only), and the image search must
+        finish early enough to leave ``DEADLINE_GENERATION_RESERVE`` for
+        generation (on timeout the actor run is aborted). Either fallback
+        degrades to a text-only answer with ``degraded=True``. Generation gets
+        whatever remains; if it cannot finish, ``TimeoutError`` is raised, so
+        the deadline is a hard ceiling.
+        
+        Args:
+            query (str): User's input query to process
+            speculative (bool, optional): Override the instance's ``speculative``
+                setting for this query
+            needs_images (bool, optional): Decision already made elsewhere (e.g.
+                by batched classification); skips the classification step
+            deadline (float, optional): Latency budget in seconds. Defaults to None.
+            
+        Returns:
+            dict: Complete response (see ``process_query``)
+            
+        Raises:
+            TimeoutError: If generation cannot finish within ``deadline``
+            
+        Example:
+            >>> result = await assistant.aprocess_query("Tesla Model Y interior", deadline=8.0)
+        """
+        return await self._atracked(query, self._aprocess_query(query, speculative, needs_images, deadline))
+    
+    async def _aprocess_query(self, query: str, speculative: bool = None, needs_images: bool = None,
+                              deadline: float = None) -> dict:
+        """The body of ``aprocess_query``, run with the query's metrics current."""
+        self._log(f"\n🔍 Processing: '{query}'")
+        budget = _Deadline(deadline)
+        images_data = await self._agather_images(query, speculative, needs_images, budget)
+        fetch_task = self._astart_image_fetch(images_data)
+        
+        # Step 3: LangChain generates response WITH image data context
+        self._log("📝 Generating image-aware response with LangChain...")
+        try:
+            text_response = await asyncio.wait_for(
+                self.aget_text_response_with_images(query, images_data),
+                budget.remaining()
+            )
+        except BaseException as e:
+            if fetch_task is not None:
+                fetch_task.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise TimeoutError(f"Response for '{query}' not generated within {deadline}s deadline") from None
+            raise
+        
+        images_data = await self._afinish_image_fetch(fetch_task, images_data, budget)
+        return self._build_result(query, text_response, images_data, degraded=budget.degraded)
+    
+    def process_query_stream(self, query: str, speculative: bool = None):
+        """
+        Run the full workflow, streaming the answer text as it is generated.
+        
+        Classification and image search run as in ``process_query``; the final
+        generation step is streamed so callers can show text as soon as the
+        first tokens arrive.
+        
+        Args:
+            query (str): User's input query to process
+            speculative (bool, optional): See ``process_query``
+            
+        Yields:
+            dict: ``{'type': 'chunk', 'text': str}`` for each piece of answer text,
+                then a final ``{'type': 'result', 'result': dict}`` holding the
+                ``process_query`` result plus ``time_to_first_token`` (seconds
+                from the start of the query to the first text chunk, also
+                reported in ``metrics``)
+                
+        Example:
+            >>> for event in assistant.process_query_stream("Tesla Model Y interior"):
+            ...     if event['type'] == 'chunk':
+            ...         print(event['text'], end='', flush=True)
+        """
+        return self._iter_sync(self.aprocess_query_stream(query, speculative=speculative))
+    
+    async def aprocess_query_stream(self, query: str, speculative: bool = None):
+        """
+        Async twin of ``process_query_stream``.
+        
+        Args:
+            query (str): User's input query to process
+            speculative (bool, optional): See ``process_query``
+            
+        Yields:
+            dict: Chunk events followed by one result event (see ``process_query_stream``)
+        """
+        tracked = QueryMetrics()
+        async for event in tracked.aiterate(self._aprocess_query_stream(query, speculative, tracked)):
+            yield event
+    
+    async def _aprocess_query_stream(self, query: str, speculative: bool, tracked: QueryMetrics):
+        """The body of ``aprocess_query_stream``, run with ``tracked`` current."""
+        self._log(f"\n🔍 Processing: '{query}'")
+        fetch_task = None
+        try:
+            images_data = await self._agather_images(query, speculative)
+            fetch_task = self._astart_image_fetch(images_data)
+            
+            self._log("📝 Streaming image-aware response with LangChain...")
+            chunks = []
+            async for text in self.astream_text_response_with_images(query, images_data):
+                if tracked.time_to_first_token is None:
+                    tracked.time_to_first_token = time.perf_counter() - tracked.started
+                chunks.append(text)
+                yield {'type': 'chunk', 'text': text}
+            text_response = "".join(chunks)
+            tracked.bytes['llm_response'] = tracked.bytes.get('llm_response', 0) + len(text_response.encode("utf-8"))
+            images_data = await self._afinish_image_fetch(fetch_task, images_data)
+        except BaseException as e:
+            if fetch_task is not None:
+                fetch_task.cancel()
+            if isinstance(e, Exception):
+                self._emit_metrics(query, tracked, error=e)
+            raise
+        
+        result = self._build_result(query, text_response, images_data)
+        result['metrics'] = self._emit_metrics(query, tracked)
+        result['time_to_first_token'] = tracked.time_to_first_token
+        yield {'type': 'result', 'result': result}
+    
+    def process_query_agent(self, query: str) -> dict:
+        """
+        Single-round-trip workflow: the chat model decides and answers in one call.
+        
+        ``search_images`` is bound to the model as a tool. For text-only queries
+        the model answers directly, so the separate YES/NO classification call
+        is saved. For visual queries it requests the tool once; the search runs
+        and the image-aware answer is generated as in ``process_query``.
+        
+        Args:
+            query (str): User's input query to process
+            
+        Returns:
+            dict: Complete response (see ``process_query``)
+            
+        Example:
+            >>> result = assistant.process_query_agent("What is machine learning?")  # one LLM call
+        """
+        return self._run_sync(self.aprocess_query_agent(query))
+    
+    async def aprocess_query_agent(self, query: str) -> dict:
+        """
+        Async twin of ``process_query_agent``.
+        
+        Args:
+            query (str): User's input query to process
+            
+        Returns:
+            dict: Complete response (see ``process_query``)
+        """
+        return await self._atracked(query, self._aprocess_query_agent(query))
+    
+    async def _aprocess_query_agent(self, query: str) -> dict:
+        """The body of ``aprocess_query_agent``, run with the query's metrics current."""
+        self._log(f"\n🔍 Processing (agent mode): '{query}'")
+        if self._agent_llm is None:
+            self._agent_llm = self.llm.bind_tools([self.SEARCH_IMAGES_TOOL])
+        
+        prompt = self._build_agent_prompt(query)
+        # Decides on a search, and for text-only queries writes the whole answer
+        with stage('agent'):
+            tokens = self._call_tokens(prompt, self.generation_profile)
+            async with _slot(_LLM_SLOTS), throttle(self.generation_limiter, tokens) as permit:
+                response = await self._agent_llm.ainvoke(prompt)
+                permit.record_usage(response)
+        record_llm_call(response, prompt)
+        tool_calls = [call for call in response.tool_calls if call['name'] == self.SEARCH_IMAGES_TOOL['name']]
+        if not tool_calls:
+            self._log("🧠 Answered directly (text only)")
+            return self._build_result(query, response.content, {})
+        
+        search_query = tool_calls[0]['args'].get('query') or query
+        self._log(f"🚀 Model requested images; searching with Apify Actor for '{search_query}'...")
+        images_data = await self.asearch_images(search_query)
+        self._log(f"✅ Found {images_data.get('total_results', 0)} images from {len(images_data.get('search_perspectives', []))} perspectives")
+        
+        fetch_task = self._astart_image_fetch(images_data)
+        self._log("📝 Generating image-aware response with LangChain...")
+        try:
+            text_response = await self.aget_text_response_with_images(query, images_data)
+        except BaseException:
+            if fetch_task is not None:
+                fetch_task.cancel()
+            raise
+        images_data = await self._afinish_image_fetch(fetch_task, images_data)
+        return self._build_result(query, text_response, images_data)
+    
+    def _build_agent_prompt(self, query: str) -> str:
+        """Build the agent-mode prompt: answer directly or request image search."""
+        return f"""
+Answer this query comprehensively: "{query}"
+
+If real images from the web are needed to answer this query properly, do not answer yet:
+call the search_images tool once instead. Otherwise, answer directly.
+"""
+    
+    def process_query_progressive(self, query: str, speculative: bool = None):
+        """
+        Two-phase workflow: a quick text answer first, the image-aware one second.
+        
+        For visual queries, the plain text answer (the no-images prompt of
+        ``get_text_response_with_images``) is generated while the Apify search
+        runs, and delivered as soon as it is ready. Once the search completes,
+        an image-aware revision follows. Text-only queries produce just the
+        final phase.
+        
+        Args:
+            query (str): User's input query to process
+            speculative (bool, optional): See ``process_query``
+            
+        Yields:
+            dict: ``{'phase': 'draft', 'result': dict}`` with the text-only answer
+                (visual queries only), then ``{'phase': 'final', 'result': dict}``;
+                each ``result`` is shaped like a ``process_query`` result
+                
+        Example:
+            >>> for update in assistant.process_query_progressive("Tesla Model Y interior"):
+            ...     show(update['result']['text_response'], final=update['phase'] == 'final')
+        """
+        return self._iter_sync(self.aprocess_query_progressive(query, speculative=speculative))
+    
+    async def aprocess_query_progressive(self, query: str, speculative: bool = None):
+        """
+        Async twin of ``process_query_progressive``.
+        
+        Args:
+            query (str): User's input query to process
+            speculative (bool, optional): See ``process_query``
+            
+        Yields:
+            dict: Draft and final phases (see ``process_query_progressive``)
+        """
+        tracked = QueryMetrics()
+        try:
+            async for update in tracked.aiterate(self._aprocess_query_progressive(query, speculative)):
+                final = update['phase'] == 'final'
+                update['result']['metrics'] = self._emit_metrics(query, tracked) if final else tracked.as_dict()
+                yield update
+        except Exception as e:
+            self._emit_metrics(query, tracked, error=e)
+            raise
+    
+    async def _aprocess_query_progressive(self, query: str, speculative: bool = None):
+        """The body of ``aprocess_query_progressive``, run with the query's metrics current."""
+        self._log(f"\n🔍 Processing: '{query}'")
+        search_task = await self._astart_image_search(query, speculative)
+        if search_task is None:
+            text_response = await self.aget_text_response_with_images(query, {})
+            yield {'phase': 'final', 'result': self._build_result(query, text_response, {})}
+            return
+        
+        try:
+            # Phase 1: plain answer, generated while the actor is still running
+            self._log("📝 Drafting text-only response while images are found...")
+            draft = await self.aget_text_response_with_images(query, {})
+            yield {'phase': 'draft', 'result': self._build_result(query, draft, {})}
+            images_data = await search_task
+        finally:
+            if not search_task.done():
+                search_task.cancel()
+        
+        # Phase 2: image-aware revision (nothing to revise if no images were found)
+        if not images_data:
+            yield {'phase': 'final', 'result': self._build_result(query, draft, {})}
+            return
+        self._log(f"✅ Found {images_data.get('total_results', 0)} images; revising with image context...")
+        fetch_task = self._astart_image_fetch(images_data)
+        try:
+            text_response = await self.aget_text_response_with_images(query, images_data)
+        except BaseException:
+            if fetch_task is not None:
+                fetch_task.cancel()
+            raise
+        images_data = await self._afinish_image_fetch(fetch_task, images_data)
+        yield {'phase': 'final', 'result': self._build_result(query, text_response, images_data)}
+    
+    async def _agather_images(self, query: str, speculative: bool = None, needs_images: bool = None,
+                              budget: _Deadline = None) -> dict:
+        """
+        Steps 1 and 2 of the workflow: classify the query, then search if needed.
+        
+        Args:
+            query (str): User's input query
+            speculative (bool, optional): See ``aprocess_query``
+            needs_images (bool, optional): Precomputed decision, skipping classification
+            budget (_Deadline, optional): Latency budget; stages that overrun it are
+                abandoned and ``budget.degraded`` is set
+            
+        Returns:
+            dict: Image search results, or {} for text-only queries
+        """
+        budget = budget or _Deadline()
+        search_task = await self._astart_image_search(query, speculative, needs_images, budget)
         
         # Step 2: Search images with Apify if needed
         images_data = {}
-        if needs_images:
-            print("🚀 Searching with Apify Actor...")
-            images_data = self.search_images(query)
-            print(f"✅ Found {images_data.get('total_results', 0)} images from {len(images_data.get('search_perspectives', []))} perspectives")
+        if search_task is not None:
+            try:
+                images_data = await asyncio.wait_for(
+                    search_task,
+                    budget.remaining(reserve=self.DEADLINE_GENERATION_RESERVE)
+                )
+            except asyncio.TimeoutError:
+                self._log("⏱️ Image search overran its budget; answering text-only")
+                budget.degraded = True
+                return {}
+            self._log(f"✅ Found {images_data.get('total_results', 0)} images from {len(images_data.get('search_perspectives', []))} perspectives")
+        return images_data
+    
+    async def _astart_image_search(self, query: str, speculative: bool = None, needs_images: bool = None,
+                                   budget: _Deadline = None):
+        """
+        Step 1 of the workflow: classify the query and, if needed, start the search.
         
-        # Step 3: LangChain generates response WITH image data context
-        print("📝 Generating image-aware response with LangChain...")
-        text_response = self.get_text_response_with_images(query, images_data)
+        Args:
+            query (str): User's input query
+            speculative (bool, optional): See ``aprocess_query``
+            needs_images (bool, optional): Precomputed decision, skipping classification
+            budget (_Deadline, optional): Latency budget for classification
+            
+        Returns:
+            asyncio.Task or None: The running image search, or None for text-only queries
+        """
+        budget = budget or _Deadline()
+        if speculative is None:
+            speculative = self.speculative
+        if needs_images is not None:
+            record_cache('decision', 'given')
+        
+        # Optionally start the image search before we know it is needed
+        search_task = None
+        if needs_images is None and speculative and self.speculation_policy.allow():
+            self._log("⚡ Speculative Apify search started alongside analysis...")
+            search_task = asyncio.ensure_future(self.asearch_images(query))
+        
+        # Step 1: LangChain decides if images are needed
+        try:
+            if needs_images is None:
+                needs_images = await asyncio.wait_for(
+                    self.ashould_search_images(query),
+                    budget.share(self.DEADLINE_CLASSIFICATION_SHARE)
+                )
+        except asyncio.TimeoutError:
+            self._log("⏱️ Analysis overran its budget; answering text-only")
+            budget.degraded = True
+            needs_images = False
+        except BaseException:
+            if search_task is not None:
+                search_task.cancel()
+                self.speculation_policy.release()
+            raise
+        self._log(f"🧠 LangChain analysis: {'Images needed' if needs_images else 'Text only'}")
+        
+        if search_task is not None:
+            self.speculation_policy.record(wasted=not needs_images)
+            if not needs_images:
+                self._log("🗑️ Discarding speculative search")
+                search_task.cancel()
+                await asyncio.gather(search_task, return_exceptions=True)
+                return None
+        
+        if not needs_images:
+            return None
+        if search_task is not None:
+            self._log("🚀 Awaiting speculative Apify search...")
+        else:
+            self._log("🚀 Searching with Apify Actor...")
+            search_task = asyncio.ensure_future(self.asearch_images(query))
+        return search_task
+    
+    def _astart_image_fetch(self, images_data: dict):
+        """
+        Start downloading result images, to run alongside answer generation.
+        
+        Returns:
+            asyncio.Task or None: The running fetch, or None without a
+                ``downloader`` or images
+        """
+        if self.downloader is None or not images_data.get('images'):
+            return None
+        self._log(f"📥 Downloading {len(images_data['images'])} images alongside generation...")
+        return asyncio.ensure_future(self._afetch_images(images_data['images']))
+    
+    async def _afetch_images(self, images: list) -> list:
+        """Run the downloader as the ``download`` stage of the current query."""
+        with stage('download'):
+            return await self.downloader.afetch(images)
+    
+    async def _afinish_image_fetch(self, fetch_task, images_data: dict, budget: _Deadline = None) -> dict:
+        """
+        Wait for a fetch from ``_astart_image_fetch`` and attach its results.
         
+        A failed fetch, or one that overruns ``budget`` (which then counts as
+        degraded), leaves the images with their remote URLs only.
+        
+        Returns:
+            dict: ``images_data`` with downloaded images (each with ``local_path``)
+        """
+        if fetch_task is None:
+            return images_data
+        budget = budget or _Deadline()
+        try:
+            images = await asyncio.wait_for(fetch_task, budget.remaining())
+        except asyncio.TimeoutError:
+            self._log("⏱️ Image downloads overran the budget; returning remote URLs only")
+            budget.degraded = True
+            return images_data
+        except Exception as e:
+            self._log(f"⚠️ Image download failed: {e}")
+            return images_data
+        stored = sum(1 for img in images if img.get('local_path'))
+        record_count('images_stored', stored)
+        self._log(f"📦 Stored {stored}/{len(images)} images locally")
+        return dict(images_data, images=images)
+    
+    async def _atracked(self, query: str, coro) -> dict:
+        """
+        Await a query pipeline with fresh metrics current, and attach them to its result.
+        
+        The metrics are also passed to every ``metrics_callbacks`` entry, on
+        failure too (with an ``error`` entry).
+        """
+        tracked = QueryMetrics()
+        token = tracked.activate()
+        try:
+            result = await coro
+        except Exception as e:
+            self._emit_metrics(query, tracked, error=e)
+            raise
+        finally:
+            tracked.deactivate(token)
+        result['metrics'] = self._emit_metrics(query, tracked)
+        return result
+    
+    def _emit_metrics(self, query: str, tracked: QueryMetrics, error: Exception = None) -> dict:
+        """Export a query's metrics and hand them to the metrics callbacks."""
+        report = tracked.as_dict()
+        if error is not None:
+            report['error'] = f"{type(error).__name__}: {error}"
+        for callback in self.metrics_callbacks:
+            try:
+                callback(query, report)
+            except Exception as e:
+                self._log(f"⚠️ Metrics callback failed: {e}")
+        return report
+    
+    @staticmethod
+    def _build_result(query: str, text_response: str, images_data: dict, degraded: bool = False) -> dict:
+        """Assemble the ``process_query`` result dictionary."""
         return {
             'query': query,
             'text_response': text_response,
             'images': images_data.get('images', []),
             'total_images': images_data.get('total_results', 0),
             'perspectives': images_data.get('search_perspectives', []),
-            'image_aware_response': bool(images_data)
+            'image_aware_response': bool(images_data),
+            'degraded': degraded
         }
+    
+    def process_queries(self, queries, max_concurrency: int = 8, llm_concurrency: int = None,
+                        apify_concurrency: int = None, ordered: bool = True,
+                        classify_batch_size: int = 25) -> list:
+        """
+        Process many queries concurrently with bounded Gemini and Apify concurrency.
+        
+        Queries are fanned out over a pool of ``max_concurrency`` workers on the
+        event loop. Independently of that, at most ``llm_concurrency`` Gemini
+        calls and ``apify_concurrency`` actor runs are in flight at any time.
+        A failing query does not abort the batch; it is reported in its result.
+        
+        Classification is batched: consecutive queries are classified
+        ``classify_batch_size`` at a time with ``ashould_search_images_batch``,
+        cutting classifier request volume accordingly.
+        
+        Args:
+            queries (iterable of str): Queries to process
+            max_concurrency (int, optional): Queries in flight at once. Defaults to 8.
+            llm_concurrency (int, optional): Concurrent Gemini calls.
+                Defaults to ``max_concurrency``.
+            apify_concurrency (int, optional): Concurrent actor runs.
+                Defaults to ``max_concurrency``.
+            ordered (bool, optional): Return results in input order (True) or
+                in completion order (False). Defaults to True.
+            classify_batch_size (int, optional): Queries per classifier prompt;
+                1 or None classifies each query separately. Defaults to 25.
+                
+        Returns:
+            list: One dict per query. Successful entries are the ``process_query``
+                result plus ``index`` (position in ``queries``) and ``error: None``;
+                failed entries contain ``index``, ``query`` and ``error`` (message).
+                
+        Example:
+            >>> results = assistant.process_queries(queries, max_concurrency=32, apify_concurrency=4)
+            >>> failed = [r for r in results if r['error']]
+        """
+        return self._run_sync(self.aprocess_queries(
+            queries,
+            max_concurrency=max_concurrency,
+            llm_concurrency=llm_concurrency,
+            apify_concurrency=apify_concurrency,
+            ordered=ordered,
+            classify_batch_size=classify_batch_size
+        ))
+    
+    async def aprocess_queries(self, queries, max_concurrency: int = 8, llm_concurrency: int = None,
+                               apify_concurrency: int = None, ordered: bool = True,
+                               classify_batch_size: int = 25) -> list:
+        """
+        Async twin of ``process_queries``.
+        
+        Args:
+            queries (iterable of str): Queries to process
+            max_concurrency (int, optional): Queries in flight at once. Defaults to 8.
+            llm_concurrency (int, optional): Concurrent Gemini calls
+            apify_concurrency (int, optional): Concurrent actor runs
+            ordered (bool, optional): Input order (True) or completion order (False)
+            classify_batch_size (int, optional): Queries per classifier prompt. Defaults to 25.
+            
+        Returns:
+            list: One result dict per query (see ``process_queries``)
+        """
+        results = [result async for result in self.aiter_process_queries(
+            queries,
+            max_concurrency=max_concurrency,
+            llm_concurrency=llm_concurrency,
+            apify_concurrency=apify_concurrency,
+            classify_batch_size=classify_batch_size
+        )]
+        if ordered:
+            results.sort(key=lambda result: result['index'])
+        return results
+    
+    async def aiter_process_queries(self, queries, max_concurrency: int = 8, llm_concurrency: int = None,
+                                    apify_concurrency: int = None, classify_batch_size: int = 25):
+        """
+        Process many queries concurrently, yielding each result as it completes.
+        
+        Args:
+            queries (iterable of str): Queries to process
+            max_concurrency (int, optional): Queries in flight at once. Defaults to 8.
+            llm_concurrency (int, optional): Concurrent Gemini calls
+            apify_concurrency (int, optional): Concurrent actor runs
+            classify_batch_size (int, optional): Queries per classifier prompt. Defaults to 25.
+            
+        Yields:
+            dict: Result for one query (see ``process_queries``), in completion order
+            
+        Example:
+            >>> async for result in assistant.aiter_process_queries(queries):
+            ...     print(result['index'], result['error'])
+        """
+        pending = list(enumerate(queries))
+        llm_slots = asyncio.Semaphore(llm_concurrency or max_concurrency)
+        apify_slots = asyncio.Semaphore(apify_concurrency or max_concurrency)
+        completed = asyncio.Queue()
+        remaining = iter(pending)
+        batch_size = classify_batch_size or 1
+        classified = {}
+        
+        async def decide(index):
+            # Classify the whole chunk containing this query on first demand
+            chunk = index // batch_size
+            if chunk not in classified:
+                chunk_queries = [query for _, query in pending[chunk * batch_size:(chunk + 1) * batch_size]]
+                classified[chunk] = asyncio.ensure_future(
+                    self.ashould_search_images_batch(chunk_queries, batch_size)
+                )
+            try:
+                decisions = await asyncio.shield(classified[chunk])
+            except Exception as e:
+                if is_rate_limited(e):
+                    raise
+                # An individual fallback in the chunk failed: retry just this query,
+                # so the error is reported for the queries it really affects
+                return await self.ashould_search_images(pending[index][1])
+            return decisions[index % batch_size]
+        
+        async def worker():
+            # Each worker task has its own context copy, so these limits apply
+            # to this batch only (including any tasks the pipeline spawns)
+            _LLM_SLOTS.set(llm_slots)
+            _APIFY_SLOTS.set(apify_slots)
+            for index, query in remaining:
+                completed.put_nowait(await self._aprocess_batch_item(
+                    index, query, decide if batch_size > 1 else None
+                ))
+        
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(max_concurrency, len(pending)))]
+        try:
+            for _ in pending:
+                yield await completed.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            for task in classified.values():
+                task.cancel()
+            await asyncio.gather(*workers, *classified.values(), return_exceptions=True)
+    
+    async def _aprocess_batch_item(self, index: int, query: str, decide=None) -> dict:
+        """Run one batch query, turning a failure into an error entry."""
+        try:
+            needs_images = await decide(index) if decide is not None else None
+            result = await self.aprocess_query(query, needs_images=needs_images)
+        except Exception as e:
+            self._log(f"❌ Query {index} failed: {e}")
+            return {'index': index, 'query': query, 'error': f"{type(e).__name__}: {e}"}
+        result.update(index=index, error=None)
+        return result
+    
+    def close(self):
+        """
+        Stop the background event loop used by the synchronous wrappers.
+        
+        Safe to call more than once; the loop is recreated on next sync use.
+        """
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._acancel_background_tasks(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+    
+    async def _acancel_background_tasks(self):
+        """Cancel outstanding background work (e.g. cache refreshes) on this loop."""
+        tasks = [task for task in self._background_tasks if task.get_loop() is asyncio.get_running_loop()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Return the background event loop, starting it on first use."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="assistant-event-loop",
+                    daemon=True
+                )
+                self._loop_thread.start()
+            return self._loop
+    
+    def _spawn(self, coro) -> asyncio.Task:
+        """Start a fire-and-forget task, keeping a reference until it finishes."""
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+    
+    @staticmethod
+    async def _in_thread(func, *args):
+        """Run a blocking call (e.g. local disk I/O) in the default executor."""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+    
+    def _log(self, message: str):
+        """Print a progress message when ``verbose`` is enabled."""
+        if self.verbose:
+            print(message)
+    
+    def _iter_sync(self, agen):
+        """Iterate an async generator from synchronous code via the background loop."""
+        try:
+            while True:
+                try:
+                    yield self._run_sync(_anext(agen))
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run_sync(agen.aclose())
+    
+    def _run_sync(self, coro):
+        """
+        Run a coroutine on the background loop and block until it finishes.
+        
+        Using one long-lived loop (rather than ``asyncio.run`` per call) keeps
+        the async clients bound to a single loop and works even when the caller
+        is itself inside a running event loop.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
 
 def demo():
     """
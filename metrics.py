@@ -0,0 +1,165 @@
+import contextlib
+import contextvars
+import time
+
+_CURRENT = contextvars.ContextVar("query_metrics", default=None)
+
+class QueryMetrics:
+    """
+    Structured timings and resource counts for one processed query.
+
+    ``process_query`` makes an instance current for the duration of the
+    query; the pipeline stages record into whichever instance is current
+    (see the module-level ``stage`` and ``record_*`` helpers, which do
+    nothing outside a tracked query). Tasks started during the query, such
+    as a speculative search or image downloads, record into it too.
+
+    Attributes:
+        stages (dict): Seconds spent per stage (summed if a stage runs twice)
+        tokens (dict): ``input``, ``output`` and ``total`` tokens over all LLM calls
+        llm_calls (int): Chat model calls made
+        bytes (dict): Bytes sent or received, per kind
+        items (dict): Item counts, e.g. images and perspectives found
+        cache (dict): How each cacheable step was served
+        time_to_first_token (float): Seconds to the first streamed text (streaming only)
+    """
+
+    def __init__(self):
+        """Start the clock for a new query."""
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tokens = {'input': 0, 'output': 0, 'total': 0}
+        self.llm_calls = 0
+        self.bytes = {}
+        self.items = {}
+        self.cache = {}
+        self.time_to_first_token = None
+
+    def activate(self):
+        """
+        Make these the current metrics of the running context.
+
+        Returns:
+            contextvars.Token: Token for ``deactivate``
+        """
+        return _CURRENT.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        """Restore the metrics that were current before ``activate``."""
+        _CURRENT.reset(token)
+
+    async def aiterate(self, steps):
+        """
+        Iterate an async generator with these metrics current during each step.
+
+        The metrics are restored after every step rather than held across the
+        ``yield``, so the consumer's context is left untouched between items.
+        Each step may run in a different context (e.g. when iterated from
+        synchronous code), which a single ``activate``/``deactivate`` around
+        the whole iteration could not handle.
+
+        Args:
+            steps: Async generator to drive
+
+        Yields:
+            The items of ``steps``
+        """
+        try:
+            while True:
+                token = self.activate()
+                try:
+                    item = await steps.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    self.deactivate(token)
+                yield item
+        finally:
+            token = self.activate()
+            try:
+                await steps.aclose()
+            finally:
+                self.deactivate(token)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as stage ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def add_usage(self, message):
+        """Add the ``usage_metadata`` of an LLM response (or chunk) to the token counts."""
+        usage = getattr(message, 'usage_metadata', None) or {}
+        for kind in self.tokens:
+            self.tokens[kind] += int(usage.get(f"{kind}_tokens") or 0)
+
+    def as_dict(self) -> dict:
+        """
+        Export the metrics.
+
+        Returns:
+            dict: ``stages`` (seconds, plus ``total`` so far), ``tokens``,
+                ``llm_calls``, ``bytes``, ``items`` and ``cache``, plus
+                ``time_to_first_token`` when streaming
+        """
+        report = {
+            'stages': dict(self.stages, total=time.perf_counter() - self.started),
+            'tokens': dict(self.tokens),
+            'llm_calls': self.llm_calls,
+            'bytes': dict(self.bytes),
+            'items': dict(self.items),
+            'cache': dict(self.cache)
+        }
+        if self.time_to_first_token is not None:
+            report['time_to_first_token'] = self.time_to_first_token
+        return report
+
+def current():
+    """Return the metrics of the query being processed, or None."""
+    return _CURRENT.get()
+
+@contextlib.contextmanager
+def stage(name: str):
+    """Time the enclosed block as stage ``name`` of the current query, if any."""
+    metrics = _CURRENT.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(name):
+        yield
+
+def record_llm_call(response=None, prompt: str = None):
+    """Count one chat model call with its token usage and prompt/response sizes."""
+    metrics = _CURRENT.get()
+    if metrics is None:
+        return
+    metrics.llm_calls += 1
+    if response is not None:
+        metrics.add_usage(response)
+        content = getattr(response, 'content', None)
+        if isinstance(content, str):
+            record_bytes('llm_response', len(content.encode("utf-8")))
+    if prompt is not None:
+        record_bytes('llm_prompt', len(prompt.encode("utf-8")))
+
+def record_bytes(kind: str, count: int):
+    """Add ``count`` bytes of ``kind`` to the current query, if any."""
+    metrics = _CURRENT.get()
+    if metrics is not None:
+        metrics.bytes[kind] = metrics.bytes.get(kind, 0) + count
+
+def record_count(name: str, count: int):
+    """Set item count ``name`` of the current query, if any."""
+    metrics = _CURRENT.get()
+    if metrics is not None:
+        metrics.items[name] = count
+
+def record_cache(name: str, outcome):
+    """Record how cacheable step ``name`` was served (e.g. ``'hit'``, ``'miss'``)."""
+    metrics = _CURRENT.get()
+    if metrics is not None:
+        metrics.cache[name] = outcome
@@ -0,0 +1,379 @@
+import asyncio
+import contextlib
+import re
+import threading
+import time
+from collections import deque
+
+# Error messages of throttled calls: a standalone 429 status, Google's
+# RESOURCE_EXHAUSTED, or Apify's "...-limit-exceeded" error types
+_RATE_LIMIT_MESSAGE = re.compile(
+    r"\b429\b|\bresource[_ ]exhausted\b|\brate[- ]limit(?:ed)?\b|\btoo many requests\b|\b[a-z-]+-limit-exceeded\b",
+    re.IGNORECASE
+)
+
+def is_rate_limited(error: BaseException) -> bool:
+    """
+    Tell whether an exception means the backend throttled the call.
+
+    Recognizes HTTP 429 status codes (``status_code`` or ``code``), Google's
+    ``ResourceExhausted`` and Apify's ``*-limit-exceeded`` errors, including
+    when they are the cause of a wrapping exception.
+
+    Args:
+        error (BaseException): Exception raised by a backend call
+
+    Returns:
+        bool: True for rate limit and quota errors
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        for attribute in ('status_code', 'code'):
+            if getattr(error, attribute, None) == 429:
+                return True
+        if type(error).__name__ in ("ResourceExhausted", "RateLimitError", "TooManyRequests"):
+            return True
+        if _RATE_LIMIT_MESSAGE.search(f"{getattr(error, 'type', '') or ''} {error}"):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+class TokenBucket:
+    """
+    Pace acquisitions to a sustained rate per minute, allowing short bursts.
+
+    Acquisitions reserve their amount at once, even if the bucket goes into
+    debt, and then sleep until the debt is paid off, so waiters are served in
+    arrival order without polling. The bucket is not tied to an event loop and
+    can be shared by callers on different loops and threads.
+
+    Attributes:
+        per_minute (float): Sustained rate, e.g. requests or tokens per minute
+        capacity (float): Largest burst, in the same unit
+    """
+
+    def __init__(self, per_minute: float, burst: float = None):
+        """
+        Configure the bucket, initially full.
+
+        Args:
+            per_minute (float): Sustained rate per minute
+            burst (float, optional): Bucket capacity. Defaults to 10 seconds'
+                worth of the rate (at least 1).
+        """
+        self.per_minute = per_minute
+        self.capacity = burst if burst is not None else max(1.0, per_minute / 6)
+        self._rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    async def acquire(self, amount: float = 1.0):
+        """
+        Take ``amount`` from the bucket, waiting as long as the rate requires.
+
+        Args:
+            amount (float, optional): Units to take (may exceed ``capacity``). Defaults to 1.0.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            delay = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.adjust(-amount)
+                raise
+
+    def adjust(self, amount: float):
+        """Take ``amount`` more (or give back, if negative) without waiting, e.g. to settle an estimate."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+    def drain(self):
+        """Drop the saved-up burst, so following acquisitions are paced from now."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+class AIMDLimiter:
+    """
+    Concurrency limit adapted by additive increase, multiplicative decrease.
+
+    Each call that completes in time while the limit was fully used raises
+    the limit by ``increase / limit``, i.e. by ``increase`` per round of
+    ``limit`` calls. A throttled call, or one slower than ``latency_target``,
+    multiplies it by ``decrease``. Only one decrease happens per round: calls
+    started before the last decrease cannot trigger another, since they were
+    admitted under the old limit.
+
+    Like ``TokenBucket``, it can be shared across event loops and threads.
+
+    Attributes:
+        limit (float): Current limit (``int(limit)`` calls may run at once)
+        minimum (int): Lowest limit
+        maximum (int): Highest limit
+        increase (float): Additive increase per round of calls
+        decrease (float): Multiplicative decrease factor
+        latency_target (float): Seconds above which a call counts as congestion (None = ignore latency)
+        increases (int): Rounds the limit grew
+        decreases (int): Times the limit was cut
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64, increase: float = 1.0,
+                 decrease: float = 0.5, latency_target: float = None):
+        """
+        Configure the limiter.
+
+        Args:
+            initial (int, optional): Starting limit. Defaults to 4.
+            minimum (int, optional): Lowest limit. Defaults to 1.
+            maximum (int, optional): Highest limit. Defaults to 64.
+            increase (float, optional): Additive increase per round. Defaults to 1.0.
+            decrease (float, optional): Multiplicative decrease. Defaults to 0.5.
+            latency_target (float, optional): Congestion latency in seconds.
+                Defaults to None (only throttling counts).
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.increases = 0
+        self.decreases = 0
+        self._in_use = 0
+        self._epoch = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def in_use(self) -> int:
+        """Calls currently admitted."""
+        return self._in_use
+
+    async def acquire(self) -> int:
+        """
+        Wait until a call may start.
+
+        Returns:
+            int: Admission epoch, to pass back to ``release``
+        """
+        with self._lock:
+            if self._in_use < int(self.limit) and not self._waiters:
+                self._in_use += 1
+                return self._epoch
+            waiter = (asyncio.get_running_loop(), asyncio.get_running_loop().create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    # Admitted just as we were cancelled: hand the slot on
+                    self._in_use -= 1
+                    self._wake()
+            raise
+        return waiter[1].result()
+
+    def release(self, epoch: int, latency: float = None, throttled: bool = False):
+        """
+        Finish a call and adapt the limit to how it went.
+
+        Args:
+            epoch (int): Value returned by ``acquire``
+            latency (float, optional): Duration of a successful call; None when
+                the call failed for reasons that say nothing about load.
+            throttled (bool, optional): The backend rejected the call as over its limits.
+        """
+        with self._lock:
+            self._in_use -= 1
+            congested = throttled or (
+                latency is not None and self.latency_target is not None and latency > self.latency_target
+            )
+            if congested:
+                if epoch == self._epoch:
+                    self.limit = max(float(self.minimum), self.limit * self.decrease)
+                    self._epoch += 1
+                    self.decreases += 1
+            elif latency is not None and self._in_use + 1 >= int(self.limit) and self.limit < self.maximum:
+                before = int(self.limit)
+                self.limit = min(float(self.maximum), self.limit + self.increase / self.limit)
+                self.increases += int(self.limit) > before
+            self._wake()
+
+    def _wake(self):
+        """Admit waiters while the limit allows (lock held)."""
+        while self._waiters and self._in_use < int(self.limit):
+            loop, future = self._waiters.popleft()
+            self._in_use += 1
+            loop.call_soon_threadsafe(_resolve, future, self._epoch)
+
+def _resolve(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+class Permit:
+    """
+    Admission of one backend call, returned by ``BackendLimiter.acquire``.
+
+    Attributes:
+        tokens (int): Tokens reserved for the call (an estimate)
+        used (int): Tokens the call actually used, once recorded
+    """
+
+    def __init__(self, tokens: int = 0):
+        self.tokens = tokens
+        self.used = None
+
+    def record_usage(self, message):
+        """Add the ``usage_metadata`` total of an LLM response (or streamed chunk)."""
+        usage = getattr(message, 'usage_metadata', None) or {}
+        total = usage.get('total_tokens')
+        if total:
+            self.used = (self.used or 0) + int(total)
+
+class BackendLimiter:
+    """
+    Client-side limits for one backend: request and token rates plus adaptive concurrency.
+
+    Calls first wait for an ``AIMDLimiter`` slot, then for their share of the
+    requests-per-minute and tokens-per-minute buckets. Token use is reserved
+    from an estimate and settled against the reported usage afterwards.
+    Throttled calls (see ``is_rate_limited``) halve the concurrency and drain
+    the buckets' bursts, so the backend is not hit again all at once.
+
+    Attributes:
+        name (str): Backend name used in ``stats``
+        requests (TokenBucket): Requests per minute bucket (None = unlimited)
+        tokens (TokenBucket): Tokens per minute bucket (None = unlimited)
+        concurrency (AIMDLimiter): Adaptive concurrency limit
+        calls (int): Calls admitted
+        throttled (int): Calls the backend rejected as over its limits
+        wait_seconds (float): Total time calls waited for admission
+    """
+
+    def __init__(self, name: str = "backend", requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_concurrency: int = 16, min_concurrency: int = 1, initial_concurrency: int = None,
+                 latency_target: float = None, burst_seconds: float = 10.0):
+        """
+        Configure the limits.
+
+        Args:
+            name (str, optional): Backend name. Defaults to "backend".
+            requests_per_minute (float, optional): Request quota. Defaults to None (unlimited).
+            tokens_per_minute (float, optional): Token quota. Defaults to None (unlimited).
+            max_concurrency (int, optional): Highest concurrency. Defaults to 16.
+            min_concurrency (int, optional): Lowest concurrency. Defaults to 1.
+            initial_concurrency (int, optional): Starting concurrency.
+                Defaults to a quarter of ``max_concurrency``.
+            latency_target (float, optional): Call duration in seconds above which
+                concurrency is reduced. Defaults to None (only throttling counts).
+            burst_seconds (float, optional): Seconds of quota that may be used
+                in a burst. Defaults to 10.0.
+
+        Example:
+            >>> generation = BackendLimiter("generation", requests_per_minute=1000,
+            ...                             tokens_per_minute=1_000_000, max_concurrency=32)
+        """
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute * burst_seconds / 60) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute * burst_seconds / 60) if tokens_per_minute else None
+        self.concurrency = AIMDLimiter(
+            initial=initial_concurrency or max(min_concurrency, max_concurrency // 4),
+            minimum=min_concurrency, maximum=max_concurrency, latency_target=latency_target
+        )
+        self.calls = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, tokens: int = 0):
+        """
+        Admit one call for the duration of the block.
+
+        Args:
+            tokens (int, optional): Estimated tokens of the call. Defaults to 0.
+
+        Yields:
+            Permit: Record the actual usage on it with ``record_usage``
+
+        Example:
+            >>> async with limiter.acquire(tokens=1200) as permit:
+            ...     response = await llm.ainvoke(prompt)
+            ...     permit.record_usage(response)
+        """
+        waited = time.perf_counter()
+        epoch = await self.concurrency.acquire()
+        try:
+            if self.requests is not None:
+                await self.requests.acquire(1)
+            if self.tokens is not None and tokens:
+                await self.tokens.acquire(tokens)
+        except BaseException:
+            self.concurrency.release(epoch)
+            raise
+        started = time.perf_counter()
+        self.wait_seconds += started - waited
+        self.calls += 1
+        permit = Permit(tokens)
+        try:
+            yield permit
+        except Exception as e:
+            throttled = is_rate_limited(e)
+            if throttled:
+                self.throttled += 1
+                for bucket in (self.requests, self.tokens):
+                    if bucket is not None:
+                        bucket.drain()
+            self.concurrency.release(epoch, throttled=throttled)
+            raise
+        except BaseException:
+            self.concurrency.release(epoch)
+            raise
+        else:
+            self.concurrency.release(epoch, latency=time.perf_counter() - started)
+        finally:
+            if self.tokens is not None and permit.used is not None:
+                self.tokens.adjust(permit.used - tokens)
+
+    def stats(self) -> dict:
+        """
+        Report the limiter's state.
+
+        Returns:
+            dict: ``concurrency`` (current limit), ``in_use``, ``calls``,
+                ``throttled``, ``decreases`` and ``wait_seconds``
+        """
+        return {
+            'concurrency': int(self.concurrency.limit),
+            'in_use': self.concurrency.in_use,
+            'calls': self.calls,
+            'throttled': self.throttled,
+            'decreases': self.concurrency.decreases,
+            'wait_seconds': self.wait_seconds
+        }
+
+@contextlib.asynccontextmanager
+async def throttle(limiter: BackendLimiter = None, tokens: int = 0):
+    """
+    ``limiter.acquire(tokens)``, or an unlimited permit when ``limiter`` is None.
+
+    Yields:
+        Permit: Admission of the call
+    """
+    if limiter is None:
+        yield Permit(tokens)
+        return
+    async with limiter.acquire(tokens) as permit:
+        yield permit
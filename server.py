@@ -0,0 +1,407 @@
+"""
+Async HTTP service for ``LangChainApifyAssistant``.
+
+A dependency-free HTTP/1.1 server on asyncio, sharing one assistant between
+all connections. Slow actor runs and model calls are awaited on the event
+loop rather than blocking a thread per request.
+
+Endpoints:
+    POST /query   JSON ``{"query": ..., "deadline": ..., "speculative": ...}``
+                  returns the ``process_query`` result as JSON
+                  (``GET /query?query=...`` works too)
+    GET  /stream  Server-Sent Events: ``chunk`` events with answer text, then
+                  one ``result`` event (or ``error``); also accepts POST.
+                  Takes ``query`` and ``speculative`` (no ``deadline``)
+    GET  /health  Liveness, load and coalescing statistics
+
+At most ``--workers`` queries are processed at once and at most ``--queue``
+more may wait for a worker; beyond that requests get ``503``. Identical
+concurrent JSON queries share one execution. On SIGINT/SIGTERM the server
+stops accepting connections, lets in-flight requests finish for up to
+``--drain-timeout`` seconds, then exits.
+
+Usage:
+    GEMINI_API_KEY=... APIFY_TOKEN=... python server.py --port 8080
+
+    curl -s localhost:8080/query -d '{"query": "Tesla Model Y interior"}'
+    curl -N 'localhost:8080/stream?query=Tesla+Model+Y+interior'
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+from urllib.parse import parse_qs, urlsplit
+
+from cache import normalize_query
+from concurrency import SingleFlight
+from main import LangChainApifyAssistant
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+    504: "Gateway Timeout"
+}
+
+class HTTPError(Exception):
+    """An error answered with an HTTP status and a JSON ``{"error": message}`` body."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class _Request:
+    def __init__(self, method: str, target: str, version: str, headers: dict, body: bytes):
+        self.method = method
+        self.path = urlsplit(target).path
+        self.query = {name: values[-1] for name, values in parse_qs(urlsplit(target).query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get('connection', "").lower()
+        return connection == "keep-alive" if self.version == "HTTP/1.0" else connection != "close"
+
+class AssistantServer:
+    """
+    Asyncio HTTP server exposing one shared ``LangChainApifyAssistant``.
+
+    Attributes:
+        assistant (LangChainApifyAssistant): Assistant answering every request
+        host (str): Interface to listen on
+        port (int): Port to listen on (the bound port once started, if 0 was given)
+        max_workers (int): Queries processed at once
+        max_queue (int): Queries allowed to wait for a worker
+        drain_timeout (float): Seconds in-flight requests get on shutdown
+        flight (SingleFlight): Coalesces identical concurrent JSON queries
+    """
+
+    def __init__(self, assistant: LangChainApifyAssistant, host: str = "127.0.0.1", port: int = 8080,
+                 max_workers: int = 32, max_queue: int = 128, drain_timeout: float = 30.0,
+                 header_timeout: float = 10.0, max_body_bytes: int = 64 * 1024, max_query_chars: int = 2000):
+        """
+        Configure the server.
+
+        Args:
+            assistant (LangChainApifyAssistant): Shared assistant
+            host (str, optional): Listen address. Defaults to "127.0.0.1".
+            port (int, optional): Listen port (0 = any free port). Defaults to 8080.
+            max_workers (int, optional): Concurrent queries. Defaults to 32.
+            max_queue (int, optional): Queries waiting for a worker before
+                ``503`` is returned. Defaults to 128.
+            drain_timeout (float, optional): Grace period on shutdown. Defaults to 30.0.
+            header_timeout (float, optional): Seconds to receive a request. Defaults to 10.0.
+            max_body_bytes (int, optional): Request body limit. Defaults to 64 KiB.
+            max_query_chars (int, optional): Query length limit. Defaults to 2000.
+        """
+        self.assistant = assistant
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        self.header_timeout = header_timeout
+        self.max_body_bytes = max_body_bytes
+        self.max_query_chars = max_query_chars
+        self.flight = SingleFlight()
+        self.served = 0
+        self.rejected = 0
+        self._slots = None
+        self._waiting = 0
+        self._active = 0
+        self._server = None
+        self._stopping = None
+        self._draining = False
+        self._connections = set()
+        self._busy = set()
+
+    async def start(self):
+        """Start listening (``serve`` does this and waits for shutdown)."""
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._stopping = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve(self):
+        """
+        Run until SIGINT/SIGTERM (or ``stop``), then shut down gracefully.
+
+        Example:
+            >>> asyncio.run(AssistantServer(assistant, port=8080).serve())
+        """
+        await self.start()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError, RuntimeError):
+                loop.add_signal_handler(sig, self.stop)
+        print(f"🌐 Serving on http://{self.host}:{self.port} ({self.max_workers} workers)")
+        await self._stopping.wait()
+        await self.shutdown()
+
+    def stop(self):
+        """Ask ``serve`` to shut down."""
+        self._stopping.set()
+
+    async def shutdown(self):
+        """
+        Stop accepting connections and drain in-flight requests.
+
+        Idle keep-alive connections are closed at once; requests being
+        processed get ``drain_timeout`` seconds to finish before they are
+        cancelled (which aborts their actor runs).
+        """
+        print("🛑 Shutting down: draining in-flight requests...")
+        self._draining = True
+        self._server.close()
+        for task in self._connections - self._busy:
+            task.cancel()
+        busy = set(self._busy)
+        if busy:
+            _, pending = await asyncio.wait(busy, timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        print("✅ Server stopped")
+
+    def stats(self) -> dict:
+        """
+        Report load and coalescing.
+
+        Returns:
+            dict: ``status``, ``active``, ``waiting``, ``served``, ``rejected`` and ``coalescing``
+        """
+        return {
+            'status': 'draining' if self._draining else 'ok',
+            'active': self._active,
+            'waiting': self._waiting,
+            'served': self.served,
+            'rejected': self.rejected,
+            'coalescing': self.flight.stats()
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while not self._draining:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.header_timeout)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {'error': e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                self._busy.add(task)
+                try:
+                    keep_alive = await self._dispatch(request, writer)
+                finally:
+                    self._busy.discard(task)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # Timed out, disconnected, or closed by ``shutdown``
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """Read one request; None when the client closed the connection."""
+        try:
+            line = await reader.readline()
+            if not line:
+                return None
+            parts = line.decode("latin-1").split()
+            if len(parts) != 3:
+                raise HTTPError(400, "Malformed request line")
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+        except ValueError:
+            raise HTTPError(400, "Request line or header too long") from None
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length") from None
+        if length > self.max_body_bytes:
+            raise HTTPError(413, f"Body larger than {self.max_body_bytes} bytes")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return _Request(*parts, headers, body)
+
+    async def _dispatch(self, request: _Request, writer: asyncio.StreamWriter) -> bool:
+        """Answer one request; returns whether the connection may be reused."""
+        keep_alive = request.keep_alive and not self._draining
+        try:
+            if request.path == "/health":
+                self._require(request, "GET")
+                await self._send_json(writer, 200, self.stats(), keep_alive)
+            elif request.path == "/query":
+                self._require(request, "GET", "POST")
+                result = await self._answer(**self._params(request))
+                await self._send_json(writer, 200, result, keep_alive)
+            elif request.path == "/stream":
+                self._require(request, "GET", "POST")
+                params = self._params(request)
+                await self._stream(writer, params['query'], params['speculative'])
+                return False
+            else:
+                raise HTTPError(404, f"No such endpoint: {request.path}")
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {'error': e.message}, keep_alive)
+        except TimeoutError as e:
+            await self._send_json(writer, 504, {'error': str(e)}, keep_alive)
+        except Exception as e:
+            await self._send_json(writer, 500, {'error': f"{type(e).__name__}: {e}"}, keep_alive)
+        return keep_alive
+
+    @staticmethod
+    def _require(request: _Request, *methods: str):
+        if request.method not in methods:
+            raise HTTPError(405, f"{request.method} not allowed on {request.path}")
+
+    def _params(self, request: _Request) -> dict:
+        """Extract ``query``, ``deadline`` and ``speculative`` from the body or query string."""
+        if request.method == "POST":
+            try:
+                params = json.loads(request.body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "Body is not valid JSON") from None
+            if not isinstance(params, dict):
+                raise HTTPError(400, "Body must be a JSON object")
+        else:
+            params = dict(request.query)
+
+        query = params.get('query')
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "Missing 'query'")
+        if len(query) > self.max_query_chars:
+            raise HTTPError(400, f"Query longer than {self.max_query_chars} characters")
+        deadline = params.get('deadline')
+        try:
+            deadline = float(deadline) if deadline is not None else None
+        except (TypeError, ValueError):
+            raise HTTPError(400, "'deadline' must be a number") from None
+        if deadline is not None and request.path == "/stream":
+            raise HTTPError(400, "'deadline' is not supported on /stream")
+        return {'query': query, 'deadline': deadline, 'speculative': self._flag(params.get('speculative'), 'speculative')}
+
+    @staticmethod
+    def _flag(value, name: str):
+        """Parse a boolean given as JSON, or as a string in JSON or the query string."""
+        if value is None or isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("1", "true", "yes", "on"):
+            return True
+        if isinstance(value, str) and value.strip().lower() in ("0", "false", "no", "off", ""):
+            return False
+        if isinstance(value, int):
+            return bool(value)
+        raise HTTPError(400, f"'{name}' must be true or false")
+
+    async def _answer(self, query: str, deadline: float = None, speculative: bool = None) -> dict:
+        """Process a JSON query, sharing the execution with identical concurrent ones."""
+        async def run():
+            async with self._worker():
+                return await self.assistant.aprocess_query(query, speculative=speculative, deadline=deadline)
+        return await self.flight.ado((normalize_query(query), deadline, speculative), run)
+
+    async def _stream(self, writer: asyncio.StreamWriter, query: str, speculative: bool = None):
+        """Answer with Server-Sent Events as the response is generated."""
+        async with self._worker():
+            writer.write(self._head(200, "text/event-stream", keep_alive=False, extra={"Cache-Control": "no-cache"}))
+            events = self.assistant.aprocess_query_stream(query, speculative=speculative)
+            try:
+                async for event in events:
+                    if event['type'] == 'chunk':
+                        writer.write(self._event('chunk', {'text': event['text']}))
+                    else:
+                        writer.write(self._event('result', event['result']))
+                    await writer.drain()
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                writer.write(self._event('error', {'error': f"{type(e).__name__}: {e}"}))
+                await writer.drain()
+            finally:
+                await events.aclose()
+
+    @contextlib.asynccontextmanager
+    async def _worker(self):
+        """Hold one of ``max_workers`` slots, rejecting the request if the queue is full."""
+        if self._slots.locked() and self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPError(503, "Server busy, try again later")
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self.served += 1
+            self._slots.release()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        writer.write(self._head(status, "application/json", keep_alive, length=len(body)) + body)
+        await writer.drain()
+
+    @staticmethod
+    def _head(status: int, content_type: str, keep_alive: bool, length: int = None, extra: dict = None) -> bytes:
+        lines = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            f"Content-Type: {content_type}; charset=utf-8",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        if status == 503:
+            lines.append("Retry-After: 1")
+        lines.extend(f"{name}: {value}" for name, value in (extra or {}).items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    @staticmethod
+    def _event(name: str, payload: dict) -> bytes:
+        data = json.dumps(payload, ensure_ascii=False, default=str)
+        return f"event: {name}\ndata: {data}\n\n".encode("utf-8")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve LangChainApifyAssistant over HTTP (JSON and SSE).")
+    parser.add_argument("--host", default="127.0.0.1", help="listen address")
+    parser.add_argument("--port", type=int, default=8080, help="listen port")
+    parser.add_argument("--workers", type=int, default=32, help="queries processed at once")
+    parser.add_argument("--queue", type=int, default=128, help="queries waiting for a worker before 503")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="grace period on shutdown (s)")
+    parser.add_argument("--speculative", action="store_true", help="speculate image searches by default")
+    parser.add_argument("--verbose", action="store_true", help="print pipeline progress messages")
+    args = parser.parse_args(argv)
+
+    gemini_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
+    apify_token = os.environ.get("APIFY_TOKEN") or os.environ.get("APIFY_API_TOKEN")
+    if not gemini_key or not apify_token:
+        parser.error("set GEMINI_API_KEY (or GOOGLE_API_KEY) and APIFY_TOKEN (or APIFY_API_TOKEN)")
+
+    assistant = LangChainApifyAssistant(gemini_key, apify_token, speculative=args.speculative, verbose=args.verbose)
+    server = AssistantServer(assistant, args.host, args.port, max_workers=args.workers,
+                             max_queue=args.queue, drain_timeout=args.drain_timeout)
+    try:
+        asyncio.run(server.serve())
+    finally:
+        assistant.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import unittest
+
+from main import LangChainApifyAssistant
+
+parse = LangChainApifyAssistant._parse_batch_decisions
+
+class ParseBatchDecisionsTest(unittest.TestCase):
+    def test_numbered_lines(self):
+        self.assertEqual(parse("1. YES\n2. no\n3) Yes\n", 3), [True, False, True])
+
+    def test_numbered_lines_out_of_order_and_decorated(self):
+        reply = "Here are the answers:\n**2.** NO\n3 - YES.\n1: yes"
+        self.assertEqual(parse(reply, 3), [True, False, True])
+
+    def test_missing_and_out_of_range_numbers(self):
+        self.assertEqual(parse("1. YES\n4. NO\n0. YES", 3), [True, None, None])
+
+    def test_conflicting_lines(self):
+        self.assertEqual(parse("1. YES\n2. NO\n1. NO", 2), [None, False])
+        # Repeating the same answer is not a conflict
+        self.assertEqual(parse("1. YES\n1. YES\n2. NO", 2), [True, False])
+
+    def test_bare_lines_are_positional(self):
+        self.assertEqual(parse("YES\nNO\n yes.", 3), [True, False, True])
+
+    def test_bare_lines_need_the_exact_count(self):
+        self.assertEqual(parse("YES\nNO", 3), [None, None, None])
+        self.assertEqual(parse("YES\nNO\nYES\nNO", 3), [None, None, None])
+
+    def test_numbered_lines_take_precedence_over_bare_ones(self):
+        self.assertEqual(parse("1. NO\nYES\nYES", 2), [False, None])
+
+    def test_unrelated_text(self):
+        self.assertEqual(parse("I cannot answer that.", 2), [None, None])
+        self.assertEqual(parse("", 1), [None])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from concurrency import SingleFlight
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.executions = 0
+
+    async def work(self, result="done", delay=0.05):
+        self.executions += 1
+        await asyncio.sleep(delay)
+        return result
+
+    def test_concurrent_callers_share_one_execution(self):
+        async def main():
+            return await asyncio.gather(*(self.flight.ado("key", self.work) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ["done"] * 5)
+        self.assertEqual(self.executions, 1)
+        self.assertEqual(self.flight.stats()['runs'], 1)
+        self.assertEqual(self.flight.stats()['coalesced'], 4)
+        self.assertEqual(self.flight.stats()['in_flight'], 0)
+        self.assertEqual(list(self.flight.served), [("key", 5)])
+
+    def test_distinct_keys_run_separately(self):
+        async def main():
+            return await asyncio.gather(
+                self.flight.ado("a", lambda: self.work("a")),
+                self.flight.ado("b", lambda: self.work("b"))
+            )
+
+        self.assertEqual(asyncio.run(main()), ["a", "b"])
+        self.assertEqual(self.executions, 2)
+
+    def test_exceptions_are_shared(self):
+        async def fail():
+            self.executions += 1
+            await asyncio.sleep(0.05)
+            raise ValueError("boom")
+
+        async def main():
+            return await asyncio.gather(*(self.flight.ado("key", fail) for _ in range(3)), return_exceptions=True)
+
+        errors = asyncio.run(main())
+        self.assertEqual([type(error) for error in errors], [ValueError] * 3)
+        self.assertEqual(self.executions, 1)
+
+    def test_cancelling_one_waiter_keeps_the_execution(self):
+        async def main():
+            first = asyncio.ensure_future(self.flight.ado("key", self.work))
+            second = asyncio.ensure_future(self.flight.ado("key", self.work))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second, first.cancelled()
+
+        self.assertEqual(asyncio.run(main()), ("done", True))
+        self.assertEqual(self.executions, 1)
+
+    def test_cancelling_the_last_waiter_cancels_the_execution(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def main():
+            waiters = [asyncio.ensure_future(self.flight.ado("key", slow)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0.01)
+            # The abandoned call is retired, so a new caller starts afresh
+            self.assertEqual(self.flight.stats()['in_flight'], 0)
+            return await self.flight.ado("key", self.work)
+
+        self.assertEqual(asyncio.run(main()), "done")
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(self.executions, 1)
+
+    def test_threads_share_one_execution(self):
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def work():
+            self.executions += 1
+            started.set()
+            release.wait(5)
+            return "done"
+
+        leader = threading.Thread(target=lambda: results.append(self.flight.do("key", work)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(self.flight.do("key", work))) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        # Let the followers join the leader's call before it finishes
+        while self.flight._calls["key"].callers < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(results, ["done"] * 4)
+        self.assertEqual(self.executions, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from downloads import ImageDownloader
+
+JPEG = b"\xff\xd8\xff\xe0" + b"same image bytes" * 64
+PNG = b"\x89PNG\r\n\x1a\n" + b"another image" * 64
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    """Serves a few fixed images; every request is counted per path."""
+
+    requests = Counter()
+
+    def do_GET(self):
+        type(self).requests[self.path] += 1
+        if self.path in ("/a.jpg", "/copy-of-a.jpg"):
+            self._send(200, "image/jpeg", JPEG)
+        elif self.path == "/b.png":
+            self._send(200, "image/png", PNG)
+        elif self.path == "/big.png":
+            # No Content-Length: the size limit has to be enforced while streaming
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(PNG * 100)
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class ImageDownloaderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _ImageHandler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _ImageHandler.requests.clear()
+        self.directory = tempfile.mkdtemp()
+        self.downloader = ImageDownloader(self.directory, max_bytes=len(PNG) * 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def image(self, path: str) -> dict:
+        return {'title': path, 'link': self.base + path}
+
+    def test_identical_bytes_are_stored_once(self):
+        a, copy, b = self.downloader.fetch([self.image("/a.jpg"), self.image("/copy-of-a.jpg"), self.image("/b.png")])
+        self.assertEqual(a['local_path'], copy['local_path'])
+        self.assertNotEqual(a['local_path'], b['local_path'])
+        self.assertTrue(a['local_path'].endswith(".jpg"))
+        with open(a['local_path'], "rb") as f:
+            self.assertEqual(f.read(), JPEG)
+        stored = [name for _, _, files in os.walk(self.directory) for name in files]
+        self.assertEqual(len(stored), 2)
+
+    def test_repeated_url_is_requested_once(self):
+        first, second = self.downloader.fetch([self.image("/a.jpg"), self.image("/a.jpg")])
+        self.assertEqual(first['local_path'], second['local_path'])
+        again, = self.downloader.fetch([self.image("/a.jpg")])
+        self.assertEqual(again['local_path'], first['local_path'])
+        self.assertEqual(_ImageHandler.requests["/a.jpg"], 1)
+        self.assertEqual(self.downloader.stats()['reused'], 1)
+
+    def test_missing_image_is_reported(self):
+        missing, found = self.downloader.fetch([self.image("/missing.jpg"), self.image("/b.png")])
+        self.assertIsNone(missing['local_path'])
+        self.assertIn("404", missing['download_error'])
+        self.assertIsNotNone(found['local_path'])
+        self.assertEqual(self.downloader.stats()['failed'], 1)
+
+    def test_images_over_max_bytes_are_rejected(self):
+        big, = self.downloader.fetch([self.image("/big.png")])
+        self.assertIsNone(big['local_path'])
+        self.assertIn("larger than", big['download_error'])
+        self.assertEqual([name for _, _, files in os.walk(self.directory) for name in files], [])
+
+    def test_images_without_link(self):
+        image, = self.downloader.fetch([{'title': "no link"}])
+        self.assertIsNone(image['local_path'])
+        self.assertEqual(image['download_error'], "missing link")
+        self.assertEqual(self.downloader.fetch([]), [])
+
+if __name__ == "__main__":
+    unittest.main()
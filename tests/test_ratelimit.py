@@ -0,0 +1,183 @@
+import asyncio
+import time
+import unittest
+
+from ratelimit import AIMDLimiter, BackendLimiter, TokenBucket, is_rate_limited
+
+class _StatusError(Exception):
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class _Usage:
+    def __init__(self, total_tokens: int):
+        self.usage_metadata = {'total_tokens': total_tokens}
+
+async def _timed(awaitable) -> float:
+    start = time.monotonic()
+    await awaitable
+    return time.monotonic() - start
+
+class IsRateLimitedTest(unittest.TestCase):
+    def test_throttling_errors(self):
+        self.assertTrue(is_rate_limited(_StatusError("slow down", status_code=429)))
+        self.assertTrue(is_rate_limited(RuntimeError("429 Too Many Requests")))
+        self.assertTrue(is_rate_limited(RuntimeError("RESOURCE_EXHAUSTED: quota exceeded")))
+        self.assertTrue(is_rate_limited(RuntimeError("rate-limit-exceeded")))
+
+    def test_unrelated_errors(self):
+        self.assertFalse(is_rate_limited(RuntimeError("Error 1429 in request 4291")))
+        self.assertFalse(is_rate_limited(RuntimeError("quota project not set")))
+        self.assertFalse(is_rate_limited(_StatusError("not found", status_code=404)))
+
+    def test_wrapped_errors(self):
+        try:
+            try:
+                raise _StatusError("throttled", status_code=429)
+            except _StatusError as e:
+                raise RuntimeError("search failed") from e
+        except RuntimeError as e:
+            self.assertTrue(is_rate_limited(e))
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_is_served_at_once(self):
+        bucket = TokenBucket(per_minute=60, burst=3)
+
+        async def main():
+            return await _timed(asyncio.gather(*(bucket.acquire() for _ in range(3))))
+
+        self.assertLess(asyncio.run(main()), 0.05)
+
+    def test_debt_is_paid_off_in_arrival_order(self):
+        # 10 per second, no burst left after the first unit
+        bucket = TokenBucket(per_minute=600, burst=1)
+
+        async def main():
+            await bucket.acquire()
+            return await asyncio.gather(_timed(bucket.acquire(3)), _timed(bucket.acquire(1)))
+
+        # The later, smaller acquisition waits behind the debt of the earlier one
+        large, small = asyncio.run(main())
+        self.assertAlmostEqual(large, 0.3, delta=0.08)
+        self.assertAlmostEqual(small, 0.4, delta=0.08)
+
+    def test_cancelled_acquisition_is_refunded(self):
+        bucket = TokenBucket(per_minute=600, burst=1)
+
+        async def main():
+            waiting = asyncio.ensure_future(bucket.acquire(10))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            return await _timed(bucket.acquire(1))
+
+        self.assertLess(asyncio.run(main()), 0.05)
+
+    def test_adjust_and_drain(self):
+        bucket = TokenBucket(per_minute=600, burst=5)
+        bucket.adjust(-100)
+        self.assertEqual(bucket._tokens, bucket.capacity)
+        bucket.drain()
+        self.assertLessEqual(bucket._tokens, 0.1)
+
+class AIMDLimiterTest(unittest.TestCase):
+    def test_decreases_once_per_epoch(self):
+        limiter = AIMDLimiter(initial=8, minimum=1)
+
+        async def main():
+            epochs = [await limiter.acquire() for _ in range(4)]
+            for epoch in epochs:
+                limiter.release(epoch, throttled=True)
+            self.assertEqual(limiter.limit, 4.0)
+            self.assertEqual(limiter.decreases, 1)
+            # Admitted after the cut: a new epoch, so it may cut again
+            epoch = await limiter.acquire()
+            limiter.release(epoch, throttled=True)
+            self.assertEqual(limiter.limit, 2.0)
+            self.assertEqual(limiter.decreases, 2)
+
+        asyncio.run(main())
+
+    def test_latency_over_target_counts_as_congestion(self):
+        limiter = AIMDLimiter(initial=4, latency_target=1.0)
+
+        async def main():
+            limiter.release(await limiter.acquire(), latency=0.5)
+            self.assertEqual(limiter.decreases, 0)
+            limiter.release(await limiter.acquire(), latency=2.0)
+            self.assertEqual(limiter.limit, 2.0)
+
+        asyncio.run(main())
+
+    def test_increases_only_when_fully_used(self):
+        limiter = AIMDLimiter(initial=2, maximum=3)
+
+        async def main():
+            limiter.release(await limiter.acquire(), latency=0.1)
+            self.assertEqual(limiter.limit, 2.0)
+            for _ in range(4):
+                epochs = [await limiter.acquire() for _ in range(int(limiter.limit))]
+                for epoch in epochs:
+                    limiter.release(epoch, latency=0.1)
+            self.assertEqual(limiter.limit, 3.0)
+            self.assertEqual(limiter.increases, 1)
+
+        asyncio.run(main())
+
+    def test_waiters_are_admitted_on_release(self):
+        limiter = AIMDLimiter(initial=1)
+
+        async def main():
+            epoch = await limiter.acquire()
+            waiting = asyncio.ensure_future(limiter.acquire())
+            cancelled = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiting.done())
+            cancelled.cancel()
+            await asyncio.gather(cancelled, return_exceptions=True)
+            limiter.release(epoch)
+            limiter.release(await waiting)
+            self.assertEqual(limiter.in_use, 0)
+
+        asyncio.run(main())
+
+class BackendLimiterTest(unittest.TestCase):
+    def test_throttled_call_cuts_concurrency_and_drains_bursts(self):
+        limiter = BackendLimiter("test", requests_per_minute=600, max_concurrency=8, initial_concurrency=8)
+
+        async def main():
+            with self.assertRaises(_StatusError):
+                async with limiter.acquire():
+                    raise _StatusError("slow down", status_code=429)
+
+        asyncio.run(main())
+        stats = limiter.stats()
+        self.assertEqual((stats['calls'], stats['throttled'], stats['decreases']), (1, 1, 1))
+        self.assertEqual(stats['concurrency'], 4)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertLessEqual(limiter.requests._tokens, 0.1)
+
+    def test_other_failures_keep_concurrency(self):
+        limiter = BackendLimiter("test", max_concurrency=8, initial_concurrency=8)
+
+        async def main():
+            with self.assertRaises(ValueError):
+                async with limiter.acquire():
+                    raise ValueError("bad reply")
+
+        asyncio.run(main())
+        self.assertEqual((limiter.stats()['throttled'], limiter.stats()['concurrency']), (0, 8))
+
+    def test_token_estimate_is_settled_against_usage(self):
+        limiter = BackendLimiter("test", tokens_per_minute=6000, burst_seconds=10)
+
+        async def main():
+            async with limiter.acquire(tokens=500) as permit:
+                permit.record_usage(_Usage(100))
+
+        asyncio.run(main())
+        # 1000 burst - 100 used (the unused 400 of the estimate were given back)
+        self.assertAlmostEqual(limiter.tokens._tokens, 900, delta=5)
+
+if __name__ == "__main__":
+    unittest.main()